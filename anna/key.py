@@ -1,15 +1,7 @@
-import csv
 import os
-import random
-
-def read_file(file_path):
-    """Reads a file and returns a list of lines."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return [line.strip() for line in file.readlines()]
-
-def generate_description(title):
-    """Generates a unique description based on the title."""
-    return f"This is a unique description for the title: '{title}'"
+from metagen import UPLOAD_ROWS, generate_metadata, write_metadata_csv
+from ranking import KeywordIndex, rank_images, read_labels
+from vocab import Vocabulary
 
 def list_images_from_folder(folder_path):
     """Lists all image files in a given folder."""
@@ -50,39 +42,24 @@ def get_category_choice():
         except ValueError:
             print("Invalid input. Please enter a number.")
 
-def create_metadata_csv(titles, keywords, qualities, versions, images, output_file, category_number):
-    """Creates a CSV file with Adobe Stock metadata structure."""
-    fieldnames = ['Filename', 'Title', 'Keywords', 'Category', 'Release(s)']
-
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        num_keywords = len(keywords)
-
-        for image in images:
-            title = random.choice(titles)  # Randomly choose a title
-            quality = random.choice(qualities)
-            version = random.choice(versions)
-            unique_title = f"{title}, {quality}, {version}"
-            description = generate_description(unique_title)
-            keyword = ', '.join(random.choice(keywords) for _ in range(random.randint(3, 6)))  # Randomly select 3-6 keywords
-
-            # Use the provided category number
-            category = category_number
-
-            # Use the final title as the release name
-            release = unique_title
-
-            writer.writerow({
-                'Filename': image,
-                'Title': unique_title,
-                'Keywords': keyword,
-                'Category': category,
-                'Release(s)': release
-            })
-
-    print(f"Metadata CSV '{output_file}' created successfully for {len(images)} images.")
+def create_metadata_csv(titles, keywords, qualities, versions, images, output_file, category_number,
+                        seed=None, shard_size=None, ranked=None):
+    """Creates a CSV file with Adobe Stock metadata structure.
+
+    seed makes the random titles and keywords reproducible. With shard_size
+    (e.g. UPLOAD_ROWS), the rows are split over numbered CSVs of that size.
+    Images in ranked ({image: keywords}, from ranking.rank_images) get those
+    keywords instead of random ones. Returns the paths written.
+    """
+    rows = generate_metadata(titles, keywords, qualities, versions, images, category_number, seed,
+                             ranked=ranked)
+    paths = write_metadata_csv(output_file, rows, shard_size)
+
+    if len(paths) == 1:
+        print(f"Metadata CSV '{output_file}' created successfully for {len(images)} images.")
+    else:
+        print(f"Metadata CSVs '{paths[0]}' to '{paths[-1]}' created successfully for {len(images)} images.")
+    return paths
 
 if __name__ == "__main__":
     # File paths and configurations
@@ -90,6 +67,9 @@ if __name__ == "__main__":
     titles_file = 'tittle-roll.txt'
     images_folder = r'C:\Users\Administrator\Desktop\ADOBE-STOCKS\IMAGE\OUTPUT'
     output_csv = 'FOR-UPLOAD-metadata.csv'
+    # Classifier labels written by chua/anna-pngs.py; used to pick relevant keywords when present
+    labels_csv = r'C:\Users\Administrator\Desktop\ADOBE-STOCKS\IMAGE\metadata.csv'
+    keyword_index_file = 'keyword.index.npz'
 
     # Expanded attributes (qualities and versions)
     qualities = [
@@ -103,15 +83,23 @@ if __name__ == "__main__":
         'Dynamic Range', 'Brightened', 'Enhanced Detail', 'Artistic Filter'
     ]
 
-    # Read keywords and titles from files
-    keywords = read_file(keywords_file)
-    titles = read_file(titles_file)
+    # Read keywords and titles from files (text, or binary files compiled with vocab.py)
+    keywords = Vocabulary.open(keywords_file)
+    titles = Vocabulary.open(titles_file)
 
     # List images from the IMAGE-PRO folder
     images = list_images_from_folder(images_folder)
 
+    # Rank the keywords for each labelled image (the index is rebuilt when keyword.txt changes)
+    ranked = None
+    if os.path.exists(labels_csv):
+        index = KeywordIndex.open(keywords, keyword_index_file)
+        ranked = rank_images(index, images, read_labels(labels_csv))
+        print(f"Ranked keywords for {len(ranked)} of {len(images)} images")
+
     # Prompt for category selection
     category_number = get_category_choice()
 
     # Generate the metadata CSV for Adobe Stock with category selection
-    create_metadata_csv(titles, keywords, qualities, versions, images, output_csv, category_number)
+    create_metadata_csv(titles, keywords, qualities, versions, images, output_csv, category_number,
+                        shard_size=UPLOAD_ROWS, ranked=ranked)
@@ -0,0 +1,86 @@
+import csv
+import os
+import numpy as np
+from vocab import as_vocabulary
+
+FIELDNAMES = ['Filename', 'Title', 'Keywords', 'Category', 'Release(s)']
+
+# Adobe Stock takes metadata for up to 5,000 files per uploaded CSV
+UPLOAD_ROWS = 5000
+
+def generate_metadata(titles, keywords, qualities, versions, images, category_number, seed=None,
+                      chunk_size=10000, min_keywords=3, max_keywords=6, ranked=None):
+    """Yield lists of CSV rows [filename, title, keywords, category, release], chunk_size images at a time.
+
+    All random draws of a chunk (titles, qualities, versions, keyword counts
+    and keywords) come from one seeded NumPy Generator, so a seed reproduces
+    the same CSV. Titles are "<title>, <quality>, <version>" and also serve
+    as the release name; keywords are min_keywords..max_keywords distinct
+    picks, fewer when the list has fewer keywords. titles and keywords may
+    be lists or vocab.Vocabulary objects, whose weights are then used.
+    Images in ranked ({image: keywords}, see ranking.rank_images) get those
+    keywords instead of random ones.
+    """
+    titles = as_vocabulary(titles)
+    keywords = as_vocabulary(keywords)
+    if images and not len(titles):
+        raise ValueError("The title list is empty; add at least one title")
+    rng = np.random.default_rng(seed)
+    for start in range(0, len(images), chunk_size):
+        chunk = images[start:start + chunk_size]
+        n = len(chunk)
+        title_ids = titles.sample(rng, n).tolist()
+        quality_ids = rng.integers(len(qualities), size=n).tolist()
+        version_ids = rng.integers(len(versions), size=n).tolist()
+        counts = np.minimum(rng.integers(min_keywords, max_keywords + 1, size=n), keywords.distinct())
+        picks = [keywords[i] for i in keywords.sample_rows(rng, counts).tolist()]
+        ends = np.cumsum(counts).tolist()
+
+        rows = []
+        begin = 0
+        for image, t, q, v, end in zip(chunk, title_ids, quality_ids, version_ids, ends):
+            unique_title = f"{titles[t]}, {qualities[q]}, {versions[v]}"
+            chosen = ranked.get(image) if ranked else None
+            rows.append([image, unique_title, ', '.join(chosen or picks[begin:end]), category_number, unique_title])
+            begin = end
+        yield rows
+
+def write_metadata_csv(output_file, row_chunks, shard_size=None):
+    """Stream row chunks to output_file; returns the paths written.
+
+    With shard_size, a new CSV (output-001.csv, output-002.csv, ...), each
+    with its own header, is started every shard_size rows; a run that fits
+    in one shard keeps the plain output_file name.
+    """
+    root, ext = os.path.splitext(output_file)
+    paths = []
+    csvfile = writer = None
+    rows_in_file = 0
+    try:
+        for rows in row_chunks:
+            while rows:
+                if writer is None or (shard_size and rows_in_file == shard_size):
+                    if csvfile:
+                        csvfile.close()
+                    if len(paths) == 1:  # A second shard: number the first one too
+                        os.replace(paths[0], f"{root}-001{ext}")
+                        paths[0] = f"{root}-001{ext}"
+                    path = f"{root}-{len(paths) + 1:03d}{ext}" if paths else output_file
+                    csvfile = open(path, 'w', newline='', encoding='utf-8')
+                    writer = csv.writer(csvfile)
+                    writer.writerow(FIELDNAMES)
+                    paths.append(path)
+                    rows_in_file = 0
+                take = len(rows) if not shard_size else min(len(rows), shard_size - rows_in_file)
+                writer.writerows(rows[:take])
+                rows_in_file += take
+                rows = rows[take:]
+    finally:
+        if csvfile:
+            csvfile.close()
+
+    if not paths:  # No images: still write the header
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerow(FIELDNAMES)
+        paths.append(output_file)
+    return paths
@@ -0,0 +1,148 @@
+import csv
+import hashlib
+import os
+import zlib
+import numpy as np
+
+# Keywords are ranked against an image's classifier labels by the cosine
+# similarity of their character n-gram TF-IDF vectors. N-grams are hashed
+# into N_FEATURES buckets, and the keyword vectors are stored per feature
+# (posting lists), so a batch of queries only touches the keywords that
+# share an n-gram with it.
+
+N_FEATURES = 1 << 20
+NGRAM_RANGE = (3, 4)
+
+def _features(text, ngram_range=NGRAM_RANGE):
+    """{hashed n-gram: count} of the space-padded words of text (labels use '_' for spaces)."""
+    counts = {}
+    for word in text.lower().replace('_', ' ').replace(',', ' ').split():
+        padded = f" {word} "
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            for i in range(max(1, len(padded) - n + 1)):
+                feature = zlib.crc32(padded[i:i + n].encode('utf-8')) & (N_FEATURES - 1)
+                counts[feature] = counts.get(feature, 0) + 1
+    return counts
+
+def _counts(texts):
+    """(rows, features, counts) of the n-gram counts of texts, as flat arrays."""
+    rows, features, counts = [], [], []
+    for row, text in enumerate(texts):
+        for feature, count in _features(text).items():
+            rows.append(row)
+            features.append(feature)
+            counts.append(count)
+    return np.asarray(rows, np.int64), np.asarray(features, np.int64), np.asarray(counts, np.float64)
+
+def _tfidf(rows, features, counts, idf, n_rows):
+    """L2-normalized TF-IDF weights of flat n-gram counts."""
+    weights = counts * idf[features]
+    norms = np.sqrt(np.bincount(rows, weights ** 2, minlength=n_rows))
+    return weights / np.where(norms > 0, norms, 1)[rows]
+
+class KeywordIndex:
+    """Character n-gram TF-IDF index over a keyword list, queried in batches."""
+
+    def __init__(self, keywords, indptr, keyword_ids, weights, idf, digest):
+        self.keywords = keywords
+        self.indptr = indptr
+        self.keyword_ids = keyword_ids
+        self.weights = weights
+        self.idf = idf
+        self.digest = digest
+
+    @staticmethod
+    def keywords_digest(keywords):
+        return hashlib.sha256('\n'.join(keywords).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def build(cls, keywords):
+        keywords = list(keywords)
+        rows, features, counts = _counts(keywords)
+
+        # Smoothed inverse document frequency, as scikit-learn's TfidfVectorizer computes it
+        df = np.bincount(features, minlength=N_FEATURES)
+        idf = (np.log((1 + len(keywords)) / (1 + df)) + 1).astype(np.float32)
+        weights = _tfidf(rows, features, counts, idf, len(keywords))
+
+        order = np.argsort(features, kind='stable')
+        indptr = np.zeros(N_FEATURES + 1, np.int64)
+        np.cumsum(np.bincount(features, minlength=N_FEATURES), out=indptr[1:])
+        return cls(keywords, indptr, rows[order].astype(np.int32), weights[order].astype(np.float32), idf,
+                   cls.keywords_digest(keywords))
+
+    def save(self, path):
+        np.savez(path, keywords=np.asarray(self.keywords, dtype=str), indptr=self.indptr,
+                 keyword_ids=self.keyword_ids, weights=self.weights, idf=self.idf, digest=self.digest)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['keywords'].tolist(), data['indptr'], data['keyword_ids'], data['weights'],
+                       data['idf'], str(data['digest']))
+
+    @classmethod
+    def open(cls, keywords, path):
+        """Load the index saved at path when it was built from these keywords, else build and save it."""
+        keywords = list(keywords)
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.digest == cls.keywords_digest(keywords):
+                return index
+        index = cls.build(keywords)
+        index.save(path)
+        return index
+
+    def top_keywords(self, queries, n=40, batch_size=32):
+        """The n keywords most similar to each query text, best first (fewer when fewer match).
+
+        Each batch of queries is scored against every keyword at once: the
+        posting lists of the batch's n-grams are gathered and summed per
+        (query, keyword) with one bincount.
+        """
+        count = len(self.keywords)
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            rows, features, counts = _counts(batch)
+            weights = _tfidf(rows, features, counts, self.idf, len(batch))
+
+            # Expand every (query, n-gram) into the postings of that n-gram
+            starts = self.indptr[features]
+            lengths = self.indptr[features + 1] - starts
+            first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            positions = np.arange(int(lengths.sum())) - first + np.repeat(starts, lengths)
+            scores = np.bincount(np.repeat(rows, lengths) * count + self.keyword_ids[positions],
+                                 weights=np.repeat(weights, lengths) * self.weights[positions],
+                                 minlength=len(batch) * count).reshape(len(batch), count)
+
+            k = min(n, count)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            for ids, row_scores in zip(np.take_along_axis(top, order, axis=1),
+                                       np.take_along_axis(top_scores, order, axis=1)):
+                results.append([self.keywords[i] for i, score in zip(ids.tolist(), row_scores.tolist())
+                                if score > 0])
+        return results
+
+def read_labels(csv_path, prefix='modified_'):
+    """{file stem: classifier labels} from the metadata CSV written by chua/anna-pngs.py.
+
+    prefix, which anna-pngs.py adds to its output names, is dropped from the stems.
+    """
+    labels = {}
+    with open(csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            stem = os.path.splitext(os.path.basename(row['Filename']))[0]
+            if prefix and stem.startswith(prefix):
+                stem = stem[len(prefix):]
+            if row.get('Keywords'):
+                labels[stem] = row['Keywords']
+    return labels
+
+def rank_images(index, images, labels, n=40):
+    """{image: its n most relevant keywords} for the images that have labels (matched by file stem)."""
+    labelled = [image for image in images if os.path.splitext(image)[0] in labels]
+    queries = [labels[os.path.splitext(image)[0]] for image in labelled]
+    return dict(zip(labelled, index.top_keywords(queries, n)))
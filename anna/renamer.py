@@ -1,37 +1,213 @@
+import json
 import os
+import sys
 
-def rename_images(folder_path):
-    """Rename all image files in the specified folder."""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'}
-    
-    # Get list of files in the folder
-    files = os.listdir(folder_path)
-    
-    # Filter out only image files
-    image_files = [f for f in files if os.path.isfile(os.path.join(folder_path, f)) and os.path.splitext(f)[1].lower() in image_extensions]
-    
-    # Rename each image file
-    for i, filename in enumerate(image_files):
-        # Get file extension
-        file_ext = os.path.splitext(filename)[1]
-        
-        # Form new file name (IMG_202403_1, IMG_202403_2, ...)
-        new_filename = f"IMG_2024070002_0781815{i+1}{file_ext}"
-        
-        # Construct full paths
-        current_path = os.path.join(folder_path, filename)
-        new_path = os.path.join(folder_path, new_filename)
-        
-        # Rename file
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'}
+
+# New file names (IMG_2024070002_07818151, IMG_2024070002_07818152, ...)
+NAME_FORMAT = "IMG_2024070002_0781815{n}{ext}"
+
+JOURNAL_NAME = '.rename-journal'
+
+# Renames run in two phases: every file first moves to a unique temporary
+# name, then each temporary name moves to its final name, so a new name may
+# be an old name of another file. Before anything moves, the plan is written
+# to a journal in the folder; a marker line is appended once all files are
+# at their temporary names. From those two facts an interrupted run can be
+# finished (resume) or undone (rollback) without guessing.
+
+class RenameJournal:
+    """The plan of a bulk rename and its progress markers, kept as JSON lines in the folder."""
+
+    def __init__(self, folder_path):
+        self.path = os.path.join(folder_path, JOURNAL_NAME)
+        self.token = None
+        self.plan = []
+        self.markers = set()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def temp_name(self, i):
+        return f".rename-{self.token}-{i}"
+
+    def create(self, plan):
+        """Write and flush the whole plan before the first rename."""
+        self.token = os.urandom(4).hex()
+        self.plan = plan
+        self.markers = set()
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'token': self.token, 'count': len(plan)}) + '\n')
+            for src, dst in plan:
+                file.write(json.dumps([src, dst]) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def load(self):
+        """Read the journal; returns False when it is incomplete (no file was renamed yet then)."""
+        with open(self.path, 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+            self.token = header['token']
+            self.plan = [tuple(json.loads(line)) for line in lines[1:1 + header['count']]]
+        except (IndexError, KeyError, ValueError):
+            return False
+        self.markers = {line[1:] for line in lines[1 + header['count']:] if line.startswith('#')}
+        return len(self.plan) == header['count']
+
+    def mark(self, marker):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(f"#{marker}\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.markers.add(marker)
+
+    def remove(self):
+        os.remove(self.path)
+
+class _Folder:
+    """Renames and existence checks relative to an open directory fd where the OS supports it."""
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.fd = None
+        if os.rename in os.supports_dir_fd and os.stat in os.supports_dir_fd:
+            self.fd = os.open(folder_path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+
+    def rename(self, src, dst):
+        if self.fd is None:
+            os.rename(os.path.join(self.folder_path, src), os.path.join(self.folder_path, dst))
+        else:
+            os.rename(src, dst, src_dir_fd=self.fd, dst_dir_fd=self.fd)
+
+    def exists(self, name):
         try:
-            os.rename(current_path, new_path)
-            print(f"Renamed '{filename}' to '{new_filename}'")
-        except Exception as e:
-            print(f"Failed to rename '{filename}': {str(e)}")
+            if self.fd is None:
+                os.lstat(os.path.join(self.folder_path, name))
+            else:
+                os.stat(name, dir_fd=self.fd, follow_symlinks=False)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+
+def plan_renames(folder_path):
+    """Scan the folder once and return [(old name, new name)] for its image files.
+
+    Raises FileExistsError when a new name is taken by a file that is not
+    itself being renamed.
+    """
+    names = set()
+    image_files = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            names.add(entry.name)
+            # is_file() comes from the directory listing on most systems, not a stat per file
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                image_files.append(entry.name)
+    image_files.sort()
+
+    plan = [(filename, NAME_FORMAT.format(n=i + 1, ext=os.path.splitext(filename)[1]))
+            for i, filename in enumerate(image_files)]
+    plan = [(src, dst) for src, dst in plan if src != dst]
+
+    others = names - {src for src, _ in plan}
+    taken = [dst for _, dst in plan if dst in others]
+    if taken:
+        raise FileExistsError(f"{len(taken)} new names are taken by other files, e.g. '{taken[0]}'")
+    return plan
+
+def _run(folder, moves, progress_every, label):
+    """Apply (src, dst) renames, printing progress every progress_every files."""
+    total = len(moves)
+    for done, (src, dst) in enumerate(moves, 1):
+        folder.rename(src, dst)
+        if done % progress_every == 0 or done == total:
+            print(f"{label}: {done}/{total}")
+
+def _finish(folder, journal, progress_every, resuming=False):
+    """Run (or continue) both phases of the journal's plan, then delete the journal.
+
+    Only when resuming are files checked for, to skip those already moved;
+    a fresh plan moves every file without a stat.
+    """
+    temp_names = [journal.temp_name(i) for i in range(len(journal.plan))]
+    if 'phase1' not in journal.markers:
+        # Not yet moved files are still under their old names
+        moves = [(src, tmp) for (src, _), tmp in zip(journal.plan, temp_names)
+                 if not resuming or not folder.exists(tmp)]
+        _run(folder, moves, progress_every, "Phase 1 (temporary names)")
+        journal.mark('phase1')
+
+    moves = [(tmp, dst) for (_, dst), tmp in zip(journal.plan, temp_names)
+             if not resuming or folder.exists(tmp)]
+    _run(folder, moves, progress_every, "Phase 2 (new names)")
+    journal.remove()
+
+def rename_images(folder_path, progress_every=10000):
+    """Rename all image files in the specified folder.
+
+    An interrupted earlier run found in the folder's journal is finished
+    first instead of planning a new one.
+    """
+    journal = RenameJournal(folder_path)
+    if journal.exists() and journal.load() and 'rollback' in journal.markers:
+        print("Finishing an interrupted rollback first")
+        rollback_renames(folder_path, progress_every)
+
+    folder = _Folder(folder_path)
+    try:
+        if journal.exists():
+            if journal.load():
+                print(f"Resuming interrupted rename of {len(journal.plan)} files")
+                _finish(folder, journal, progress_every, resuming=True)
+                return journal.plan
+            journal.remove()  # Torn while being written, before any rename
+
+        plan = plan_renames(folder_path)
+        if not plan:
+            print("Nothing to rename")
+            return plan
+        journal.create(plan)
+        _finish(folder, journal, progress_every)
+        print(f"Renamed {len(plan)} files")
+        return plan
+    finally:
+        folder.close()
+
+def rollback_renames(folder_path, progress_every=10000):
+    """Undo the interrupted rename recorded in the folder's journal, restoring the old names."""
+    journal = RenameJournal(folder_path)
+    if not journal.exists() or not journal.load():
+        print("No interrupted rename to roll back")
+        return
+    folder = _Folder(folder_path)
+    try:
+        temp_names = [journal.temp_name(i) for i in range(len(journal.plan))]
+        if 'phase1' in journal.markers and 'rollback' not in journal.markers:
+            # Files already at their new names go back to temporary names first, as a
+            # new name may be another file's old name
+            moves = [(dst, tmp) for (_, dst), tmp in zip(journal.plan, temp_names) if not folder.exists(tmp)]
+            _run(folder, moves, progress_every, "Rollback (temporary names)")
+        journal.mark('rollback')
+
+        moves = [(tmp, src) for (src, _), tmp in zip(journal.plan, temp_names) if folder.exists(tmp)]
+        _run(folder, moves, progress_every, "Rollback (old names)")
+        journal.remove()
+        print(f"Restored the old names of {len(journal.plan)} files")
+    finally:
+        folder.close()
 
 if __name__ == "__main__":
     # Specify the folder path containing images
     folder_path = r'C:\Users\Administrator\Desktop\ADOBE-STOCKS\IMAGE\OUTPUT'
-    
-    # Call the function to rename images
-    rename_images(folder_path)
+
+    # Call the function to rename images (pass --rollback to undo an interrupted run)
+    if '--rollback' in sys.argv[1:]:
+        rollback_renames(folder_path)
+    else:
+        rename_images(folder_path)
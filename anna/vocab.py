@@ -0,0 +1,176 @@
+import struct
+import sys
+import numpy as np
+
+# Binary vocabulary file, little-endian and memory-mapped on load:
+#   header   magic, entry count, blob size, flags (bit 0: weighted)
+#   offsets  uint64[count + 1], start of each entry in the blob
+#   cumw     float64[count], cumulative weights (weighted files only)
+#   blob     the UTF-8 entries back to back
+MAGIC = b'ANNAVOC1'
+HEADER = struct.Struct('<8sQQQ')
+WEIGHTED = 1
+
+# Vectorized redraws of repeated picks in Vocabulary.sample_rows before the
+# exact per-row draw takes over
+MAX_REDRAWS = 4
+
+class Vocabulary:
+    """Deduplicated keywords or titles with optional weights, sampled with NumPy.
+
+    Build one from text (one entry per line, optionally "entry<TAB>weight")
+    or open a binary file written by save(), which loads in constant time:
+    entries are only decoded when indexed.
+    """
+
+    def __init__(self, entries=None, weights=None, offsets=None, blob=None):
+        self._entries = entries  # list of str, or None when backed by a blob
+        self._offsets = offsets
+        self._blob = blob
+        self._cumw = None
+        if weights is not None:
+            self._cumw = np.cumsum(np.asarray(weights, np.float64))
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Strip, drop empty lines and merge duplicates (their weights add up); entries are interned."""
+        weights = {}
+        weighted = False
+        for line in lines:
+            entry, _, weight = line.strip().partition('\t')
+            entry = entry.strip()
+            if not entry:
+                continue
+            weighted = weighted or bool(weight)
+            entry = sys.intern(entry)
+            weights[entry] = weights.get(entry, 0.0) + (float(weight) if weight else 1.0)
+        entries = list(weights)
+        return cls(entries, list(weights.values()) if weighted else None)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a binary vocabulary written by save()."""
+        data = np.memmap(path, np.uint8, 'r')
+        magic, count, blob_size, flags = HEADER.unpack(data[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a vocabulary file")
+        position = HEADER.size
+        offsets = data[position:position + 8 * (count + 1)].view('<u8')
+        position += 8 * (count + 1)
+        vocab = cls(offsets=offsets)
+        if flags & WEIGHTED:
+            vocab._cumw = data[position:position + 8 * count].view('<f8')
+            position += 8 * count
+        vocab._blob = data[position:position + blob_size]
+        return vocab
+
+    @classmethod
+    def open(cls, path):
+        """Load a binary vocabulary, or read a text file with one entry per line."""
+        with open(path, 'rb') as file:
+            is_binary = file.read(len(MAGIC)) == MAGIC
+        if is_binary:
+            return cls.load(path)
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls.from_lines(file)
+
+    def save(self, path):
+        """Write the binary format; offsets, weights and blob are copied as arrays."""
+        if self._entries is not None:
+            encoded = [entry.encode('utf-8') for entry in self._entries]
+            offsets = np.zeros(len(encoded) + 1, '<u8')
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+            blob = b''.join(encoded)
+        else:
+            offsets, blob = self._offsets, self._blob.tobytes()
+
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(self), len(blob), WEIGHTED if self._cumw is not None else 0))
+            file.write(np.asarray(offsets, '<u8').tobytes())
+            if self._cumw is not None:
+                file.write(np.asarray(self._cumw, '<f8').tobytes())
+            file.write(blob)
+
+    def __len__(self):
+        return len(self._entries) if self._entries is not None else len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if self._entries is not None:
+            return self._entries[i]
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def distinct(self):
+        """Number of entries that can be drawn (those with a non-zero weight)."""
+        if self._cumw is None:
+            return len(self)
+        return int(np.count_nonzero(np.diff(self._cumw, prepend=0)))
+
+    def sample(self, rng, size):
+        """size entry indices drawn with replacement, in proportion to the weights."""
+        if self._cumw is None:
+            return rng.integers(len(self), size=size)
+        return np.searchsorted(self._cumw, rng.random(size) * self._cumw[-1], side='right')
+
+    def _cumulative(self, i):
+        """Total weight of entries 0..i (0 for i = -1)."""
+        if i < 0:
+            return 0.0
+        return float(i + 1) if self._cumw is None else float(self._cumw[i])
+
+    def _draw_excluding(self, rng, picked):
+        """One index drawn by weight as if the weights of picked were zero.
+
+        A uniform draw over the remaining mass is shifted past the picked
+        entries' spans of the cumulative weights, in ascending order, so it
+        costs one draw and one search whatever mass the picks hold.
+        """
+        spans = sorted((self._cumulative(i - 1), self._cumulative(i)) for i in set(picked))
+        u = rng.random() * (self._cumulative(len(self) - 1) - sum(hi - lo for lo, hi in spans))
+        for lo, hi in spans:
+            if u < lo:
+                break
+            u += hi - lo
+        if self._cumw is None:
+            return min(int(u), len(self) - 1)
+        return min(int(np.searchsorted(self._cumw, u, side='right')), len(self) - 1)
+
+    def sample_rows(self, rng, counts):
+        """Draw counts[i] distinct indices for each row i; returns them flat, row after row.
+
+        Each pick is drawn by weight, so this is sequential weighted sampling
+        without replacement. A pick that repeats an earlier pick of its row
+        is redrawn, for all rows at once, up to MAX_REDRAWS times; rows still
+        repeating (heavy entries already picked) then draw exactly from the
+        unpicked mass with _draw_excluding(). Counts are capped at the number
+        of distinct entries with a weight.
+        """
+        counts = np.minimum(np.asarray(counts), self.distinct())
+        k = int(counts.max()) if len(counts) else 0
+        if k == 0:
+            return np.zeros(0, np.int64)
+
+        draws = self.sample(rng, (len(counts), k))
+        for j in range(1, k):
+            repeats = (draws[:, j:j + 1] == draws[:, :j]).any(axis=1)
+            for _ in range(MAX_REDRAWS):
+                if not repeats.any():
+                    break
+                draws[repeats, j] = self.sample(rng, int(repeats.sum()))
+                repeats = (draws[:, j:j + 1] == draws[:, :j]).any(axis=1)
+            for row in np.flatnonzero(repeats & (counts > j)):
+                draws[row, j] = self._draw_excluding(rng, draws[row, :j].tolist())
+        return draws[np.arange(k) < counts[:, np.newaxis]]
+
+def as_vocabulary(entries):
+    """entries as a Vocabulary, building one from a list of strings when needed."""
+    return entries if isinstance(entries, Vocabulary) else Vocabulary.from_lines(entries)
+
+if __name__ == "__main__":
+    # Compile a text list into the binary format: python vocab.py keyword.txt keyword.vocab
+    source, target = sys.argv[1:3]
+    vocab = Vocabulary.open(source)
+    vocab.save(target)
+    print(f"Saved {len(vocab)} entries to '{target}'")
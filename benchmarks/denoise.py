@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+# Compare denoising after upscaling (stock.py's default order) with denoising
+# at source resolution before upscaling, on synthetic noisy images whose
+# clean full-resolution original is known.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'chua'))
+
+from pipeline import denoise_image, upscale_bicubic
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic clean BGR image: smooth gradients with filled shapes and sharp edges."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=2)
+    img = img.astype(np.uint8)
+    for _ in range(40):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        if rng.random() < 0.5:
+            cv2.circle(img, center, int(rng.integers(5, max(6, width // 8))), color, -1, cv2.LINE_AA)
+        else:
+            size = rng.integers(5, max(6, width // 6), 2)
+            cv2.rectangle(img, center, (center[0] + int(size[0]), center[1] + int(size[1])), color, -1)
+    return img
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def run(width, height, scale, sigma, tile, workers, seed):
+    # The clean original is at output resolution; the input is its noisy reduction
+    clean = synthetic_image(width * scale, height * scale, seed)
+    small = cv2.resize(clean, (width, height), interpolation=cv2.INTER_AREA)
+    noise = np.random.default_rng(seed + 1).normal(0, sigma, small.shape)
+    noisy = np.clip(small + noise, 0, 255).astype(np.uint8)
+
+    rows = []
+    after, seconds = timed(lambda: denoise_image(upscale_bicubic(noisy, scale)))
+    rows.append(("upscale -> denoise", seconds, psnr(after, clean)))
+    if tile:
+        tiled, seconds = timed(lambda: denoise_image(upscale_bicubic(noisy, scale), tile, workers))
+        rows.append((f"upscale -> denoise tiled x{workers}", seconds, psnr(tiled, clean)))
+    before, seconds = timed(lambda: upscale_bicubic(denoise_image(noisy), scale))
+    rows.append(("denoise -> upscale", seconds, psnr(before, clean)))
+    rows.append(("upscale only (noisy)", 0.0, psnr(upscale_bicubic(noisy, scale), clean)))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Wall time and PSNR of denoising before vs after upscaling.")
+    parser.add_argument('--sizes', default="320x240,640x480", help="comma-separated source sizes WxH")
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--sigma', type=float, default=10.0, help="noise standard deviation")
+    parser.add_argument('--tile', type=int, default=512, help="tile size for the tiled denoiser, 0 to skip it")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'size':<12}{'order':<32}{'seconds':>10}{'PSNR dB':>10}")
+    for size in args.sizes.split(','):
+        width, height = map(int, size.lower().split('x'))
+        for order, seconds, value in run(width, height, args.scale, args.sigma, args.tile, args.workers, args.seed):
+            print(f"{size:<12}{order:<32}{seconds:>10.2f}{value:>10.2f}")
@@ -0,0 +1,252 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Time each processing stage of chua and cella on deterministic synthetic
+# images and record peak RSS. Every (stage, size) runs in a fresh interpreter
+# so peak RSS belongs to that stage alone (it includes the input image).
+# Results go to a JSON file that --compare can diff against another commit.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUA_DIR = os.path.join(REPO_DIR, 'chua')
+CELLA_DIR = os.path.join(REPO_DIR, 'cella')
+
+SIZES = {
+    '1mp': (1152, 864),
+    '12mp': (4000, 3000),
+    '24mp': (6000, 4000),
+}
+
+STAGES = ['remove_background', 'upscale_image', 'upscale_image_with_dnn', 'analyze_image',
+          'convert_png_to_vector', 'create_metadata_csv']
+
+MOBILENET_WEIGHTS = os.path.join(os.path.expanduser('~'), '.keras', 'models',
+                                 'mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_224.h5')
+
+class Skip(Exception):
+    """Raised by a stage whose model, weights or optional dependency is not available offline."""
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic BGR product shot: a noisy light backdrop with colored shapes in the middle."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    backdrop = 215 + 25 * (y / height) + rng.normal(0, 3, (height, width))
+    img = np.repeat(np.clip(backdrop, 0, 255).astype(np.uint8)[:, :, np.newaxis], 3, axis=2)
+
+    scale = min(width, height)
+    for _ in range(12):
+        color = tuple(int(c) for c in rng.integers(0, 200, 3))
+        cx = int(width / 2 + rng.normal(0, width / 10))
+        cy = int(height / 2 + rng.normal(0, height / 10))
+        if rng.random() < 0.5:
+            cv2.circle(img, (cx, cy), int(scale * rng.uniform(0.05, 0.15)), color, -1, cv2.LINE_AA)
+        else:
+            half = (scale * rng.uniform(0.05, 0.15, 2)).astype(int)
+            cv2.rectangle(img, (cx - half[0], cy - half[1]), (cx + half[0], cy + half[1]), color, -1)
+    return img
+
+def _load_script(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def prepare_stage(stage, width, height, args, workdir):
+    """Set up inputs outside the timed region and return the callable to time."""
+    sys.path.insert(0, CHUA_DIR)
+    if stage == 'create_metadata_csv':
+        from pro import create_metadata_csv
+        titles = [f"Synthetic title {i}" for i in range(200)]
+        keywords = [f"keyword{i}" for i in range(2000)]
+        images = [f"IMAGE_{i:06d}.jpg" for i in range(args.rows)]
+        output_csv = os.path.join(workdir, 'metadata.csv')
+        return lambda: create_metadata_csv(titles, keywords, images, output_csv, 1)
+
+    # Skip model stages before paying for the image
+    if stage == 'upscale_image_with_dnn':
+        from superres import SR_MODELS
+        if not os.path.exists(os.path.join(args.model_dir, SR_MODELS[('edsr', 4)])):
+            raise Skip(f"{SR_MODELS[('edsr', 4)]} not found in {args.model_dir}")
+    if stage == 'analyze_image':
+        if importlib.util.find_spec('tensorflow') is None:
+            raise Skip("tensorflow is not installed")
+        if not os.path.exists(MOBILENET_WEIGHTS):
+            raise Skip("MobileNetV2 imagenet weights are not cached")
+
+    img = synthetic_image(width, height, args.seed)
+
+    if stage == 'remove_background':
+        from pipeline import remove_background
+        return lambda: remove_background(img, working_size=args.working_size, fast=not args.no_fast)
+
+    if stage == 'upscale_image':
+        from pipeline import upscale_bicubic
+        return lambda: upscale_bicubic(img, args.scale, args.tile)
+
+    if stage == 'upscale_image_with_dnn':
+        from superres import get_sr_model
+        from pipeline import upscale_dnn
+        get_sr_model('edsr', 4, args.model_dir)  # Load the model outside the timed region
+        return lambda: upscale_dnn(img, 'edsr', 4, args.model_dir, args.tile or 256)
+
+    if stage == 'analyze_image':
+        anna_pngs = _load_script(os.path.join(CHUA_DIR, 'anna-pngs.py'), 'anna_pngs')
+        anna_pngs.analyze_image(img)  # Build the model outside the timed region
+        return lambda: anna_pngs.analyze_image(img)
+
+    if stage == 'convert_png_to_vector':
+        import cv2
+        sys.path.insert(0, CELLA_DIR)
+        from vectory import convert_png_to_vector
+        input_png = os.path.join(workdir, 'input.png')
+        cv2.imwrite(input_png, img)
+        output_svg = os.path.join(workdir, 'output.svg')
+        return lambda: convert_png_to_vector(input_png, output_svg, (width, height), args.vector_mode)
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def run_child(args):
+    """Child side: time one stage at one size and print its result as the last line of JSON."""
+    width, height = SIZES[args.child[1]]
+    result = {'status': 'ok'}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            func = prepare_stage(args.child[0], width, height, args, workdir)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            result['seconds'] = min(timings)
+        except Skip as e:
+            result = {'status': 'skipped', 'reason': str(e)}
+        except Exception as e:
+            result = {'status': 'error', 'reason': f"{type(e).__name__}: {e}"}
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+
+def measure(stage, size, args):
+    """Run one (stage, size) in a child interpreter and return its result record."""
+    command = [sys.executable, os.path.abspath(__file__), '--child', stage, size,
+               '--repeat', str(args.repeat), '--seed', str(args.seed), '--scale', str(args.scale),
+               '--tile', str(args.tile or 0), '--working-size', str(args.working_size or 0),
+               '--model-dir', args.model_dir, '--vector-mode', args.vector_mode, '--rows', str(args.rows)]
+    if args.no_fast:
+        command.append('--no-fast')
+    completed = subprocess.run(command, cwd=CHUA_DIR, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    try:
+        result = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        errors = completed.stderr.strip().splitlines()
+        result = {'status': 'error', 'reason': errors[-1] if errors else 'no output'}
+    width, height = SIZES[size]
+    result.update(stage=stage, size=size, megapixels=round(width * height / 1e6, 2))
+    return result
+
+def git_revision():
+    """(commit, dirty) of the repository, or (None, None) outside a git checkout."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+def print_header():
+    print(f"{'stage':<26}{'size':<8}{'seconds':>10}{'peak RSS MB':>14}  status")
+
+def print_results(results):
+    for r in results:
+        seconds = f"{r['seconds']:.3f}" if 'seconds' in r else '-'
+        print(f"{r['stage']:<26}{r['size']:<8}{seconds:>10}{r['peak_rss_mb']:>14.1f}  "
+              f"{r['status']}{': ' + str(r['reason']) if 'reason' in r else ''}")
+
+def compare(old, new):
+    """Print the change in time and peak RSS of every (stage, size) measured in both runs."""
+    print(f"old: {old.get('commit')}  new: {new.get('commit')}")
+    print(f"{'stage':<26}{'size':<8}{'old s':>10}{'new s':>10}{'ratio':>8}{'old MB':>10}{'new MB':>10}")
+    previous = {(r['stage'], r['size']): r for r in old['results']}
+    for r in new['results']:
+        o = previous.get((r['stage'], r['size']))
+        if o is None or 'seconds' not in o or 'seconds' not in r:
+            continue
+        print(f"{r['stage']:<26}{r['size']:<8}{o['seconds']:>10.3f}{r['seconds']:>10.3f}"
+              f"{r['seconds'] / o['seconds']:>8.2f}{o['peak_rss_mb']:>10.1f}{r['peak_rss_mb']:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every processing stage on synthetic images.")
+    parser.add_argument('--sizes', default=','.join(SIZES), help="comma-separated subset of " + ', '.join(SIZES))
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated subset of the stages")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=int, default=2, help="upscale_image factor (stock.py uses 8)")
+    parser.add_argument('--tile', type=int, default=0, help="tile size for the upscalers, 0 for untiled")
+    parser.add_argument('--working-size', type=int, default=512, help="GrabCut working size, 0 for full size")
+    parser.add_argument('--no-fast', action='store_true', help="always run GrabCut in remove_background")
+    parser.add_argument('--model-dir', default=CHUA_DIR, help="folder with EDSR_x4.pb")
+    parser.add_argument('--vector-mode', default='rects', choices=['pixels', 'rects', 'paths'])
+    parser.add_argument('--rows', type=int, default=10000, help="images in the create_metadata_csv run")
+    parser.add_argument('--output', help="results JSON (default: benchmarks/results-<commit>.json)")
+    parser.add_argument('--compare', nargs='+', metavar='JSON',
+                        help="compare with an earlier results file, or compare two files without running")
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.tile = args.tile or None
+    args.working_size = args.working_size or None
+
+    if args.child:
+        run_child(args)
+        sys.exit()
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding='utf-8') as old, open(args.compare[1], encoding='utf-8') as new:
+            compare(json.load(old), json.load(new))
+        sys.exit()
+
+    commit, dirty = git_revision()
+    results = []
+    print_header()
+    for stage in args.stages.split(','):
+        # Metadata generation does not depend on image size
+        for size in (['1mp'] if stage == 'create_metadata_csv' else args.sizes.split(',')):
+            results.append(measure(stage, size, args))
+            print_results(results[-1:])
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('child', 'compare', 'output')},
+        'results': results,
+    }
+    output = args.output or os.path.join(REPO_DIR, 'benchmarks', f"results-{(commit or 'unknown')[:12]}.json")
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as old:
+            compare(json.load(old), report)
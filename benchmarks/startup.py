@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+# Measure what each stage of the chua scripts costs to import or load, in a
+# fresh interpreter per stage so earlier imports do not hide later ones.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUA_DIR = os.path.join(REPO_DIR, 'chua')
+
+STAGES = [
+    ("python", "pass"),
+    ("numpy + cv2", "import numpy, cv2"),
+    ("pipeline", "import pipeline"),
+    ("anna-pngs.py import",
+     "import importlib.util as u; s = u.spec_from_file_location('anna_pngs', 'anna-pngs.py'); "
+     "s.loader.exec_module(u.module_from_spec(s))"),
+    ("cv2.dnn_superres", "import cv2; cv2.dnn_superres.DnnSuperResImpl_create()"),
+    ("requests", "import requests"),
+    ("pandas", "import pandas"),
+    ("tensorflow", "import tensorflow"),
+    ("MobileNetV2 (imagenet)", "import tensorflow as tf; tf.keras.applications.MobileNetV2(weights='imagenet')"),
+]
+
+# Runs inside the child: time the stage's code and report peak RSS afterwards
+PROBE = """
+import time
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+except ImportError:
+    rss_mb = float('nan')
+print(seconds, rss_mb)
+"""
+
+def measure(code, repeat=3):
+    """Best-of-repeat (seconds, peak RSS in MB) of running code in a new interpreter, or None if it fails."""
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', 'import sys\n' + PROBE.format(code=code)],
+                                cwd=CHUA_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        seconds, rss_mb = map(float, result.stdout.split()[-2:])
+        if best is None or seconds < best[0]:
+            best = (seconds, rss_mb)
+    return best
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'stage':<26}{'seconds':>10}{'peak RSS MB':>14}")
+    for name, code in STAGES:
+        result = measure(code, repeat)
+        if result is None:
+            print(f"{name:<26}{'unavailable':>10}")
+        else:
+            print(f"{name:<26}{result[0]:>10.3f}{result[1]:>14.1f}")
@@ -1,8 +1,12 @@
 import cv2
+import gzip
 import numpy as np
 import zipfile
 import os
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# SVG text is joined into chunks of about this many characters per write
+WRITE_CHUNK_SIZE = 1 << 20
 
 def color_group(pixel):
     r, g, b = pixel[:3]
@@ -57,10 +61,190 @@ def color_group(pixel):
 
     return "Other"
 
-def dominant_colors(bitmap, num_colors=5):
-    pixels = bitmap.reshape(-1, 3)
-    counter = Counter(map(tuple, pixels))
-    return [color for color, _ in counter.most_common(num_colors)]
+# Group order used by classify_pixels(); index 3 is the "Other" fallback.
+COLOR_GROUPS = ["Dark Color", "Soft Color", "Light Color", "Other"]
+
+def classify_pixels(image):
+    """Vectorized color_group(): returns a per-pixel index into COLOR_GROUPS."""
+    r = image[..., 0]
+    g = image[..., 1]
+    b = image[..., 2]
+
+    # Same threshold rules as color_group(), one boolean mask per rule
+    dark = ((r < 50) & (g < 50) & (b < 50)) \
+        | ((r < 70) & (g < 70) & (b < 70)) \
+        | ((r < 50) & (g < 50) & (b > 50)) \
+        | ((r < 50) & (g > 50) & (b < 50)) \
+        | ((r < 50) & (g > 50) & (b > 50)) \
+        | ((r < 100) & (g < 100) & (b > 100)) \
+        | ((r < 100) & (g > 100) & (b < 100))
+    soft = ((r > 150) & (g > 100) & (b > 100)) \
+        | ((r > 200) & (g > 200) & (b < 150)) \
+        | ((r < 200) & (g > 150) & (b < 200)) \
+        | ((r < 200) & (g < 200) & (b > 150)) \
+        | ((r > 100) & (g < 100) & (b > 100)) \
+        | ((r < 150) & (g < 150) & (b > 150))
+    light = ((r > 200) & (g > 200) & (b < 100)) \
+        | ((r > 200) & (g < 200) & (b > 200)) \
+        | ((r < 150) & (g > 200) & (b < 150)) \
+        | ((r < 150) & (g < 150) & (b > 200)) \
+        | ((r > 200) & (g < 150) & (b < 150)) \
+        | ((r < 200) & (g > 200) & (b > 200)) \
+        | ((r > 150) & (g > 50) & (b < 50)) \
+        | ((r < 200) & (g > 200) & (b > 100))
+
+    # Assign in reverse priority so earlier groups win, like the elif chain
+    groups = np.full(r.shape, 3, dtype=np.uint8)
+    groups[light] = 2
+    groups[soft] = 1
+    groups[dark] = 0
+    return groups
+
+def horizontal_runs(mask):
+    """Returns (ys, x_starts, x_ends) of every horizontal run of True pixels, row-major."""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    ys, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return ys, starts, ends
+
+def merge_runs(mask, tolerance=0):
+    """Merges horizontal runs into rectangles (x, y, width, height).
+
+    Runs on consecutive rows are stacked into one rectangle when their edges
+    match; with tolerance > 0, edges within the same (tolerance + 1)-pixel
+    bucket are treated as matching, which gives fewer, less exact rectangles.
+    """
+    ys, starts, ends = horizontal_runs(mask)
+    height = mask.shape[0]
+    row_bounds = np.searchsorted(ys, np.arange(height + 1)).tolist()
+    starts = starts.tolist()
+    ends = ends.tolist()
+    bucket = tolerance + 1
+
+    open_rects = {}
+    for y in range(height):
+        next_open = {}
+        for i in range(row_bounds[y], row_bounds[y + 1]):
+            x0, x1 = starts[i], ends[i]
+            key = (x0 // bucket, x1 // bucket)
+            if key in next_open:  # Two runs of one row in the same bucket
+                yield x0, y, x1 - x0, 1
+                continue
+            rect = open_rects.pop(key, None)
+            next_open[key] = rect if rect is not None else (x0, x1, y)
+
+        # Rectangles that did not continue on this row are finished
+        for x0, x1, y0 in open_rects.values():
+            yield x0, y0, x1 - x0, y - y0
+        open_rects = next_open
+
+    for x0, x1, y0 in open_rects.values():
+        yield x0, y0, x1 - x0, height - y0
+
+def pixel_elements(mask, group, band_height=64):
+    """Yields one 1x1 <rect> per pixel of the group (the original output format)."""
+    # Work in bands of rows so the coordinate arrays stay small
+    for y0 in range(0, mask.shape[0], band_height):
+        ys, xs = np.nonzero(mask[y0:y0 + band_height])
+        for x, y in zip(xs.tolist(), (ys + y0).tolist()):
+            yield f'<rect x="{x}" y="{y}" width="1" height="1" fill="{group}"/>\n'
+
+def rect_elements(mask, tolerance=0):
+    """Yields one <rect> per merged region of the group."""
+    for x, y, width, height in merge_runs(mask, tolerance):
+        yield f'<rect x="{x}" y="{y}" width="{width}" height="{height}"/>\n'
+
+def path_elements(mask, tolerance=0):
+    """Yields a single even-odd <path> tracing the outlines of the group.
+
+    Contours run through boundary pixel centers and are simplified with
+    approxPolyDP(epsilon=tolerance), so this is the smallest but lossiest mode.
+    """
+    contours = cv2.findContours(mask.astype(np.uint8), cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    yield '<path fill-rule="evenodd" d="'
+    for contour in contours:
+        if tolerance:
+            contour = cv2.approxPolyDP(contour, tolerance, True)
+        points = contour.reshape(-1, 2).tolist()
+        yield "M" + "L".join(f"{x} {y}" for x, y in points) + "Z"
+    yield '"/>\n'
+
+def group_svg(mask, group, mode="rects", tolerance=0):
+    """Yields the complete <g> element of one color group, piece by piece."""
+    if mode == "pixels":
+        yield f'<g id="{group}">\n'
+        yield from pixel_elements(mask, group)
+    else:
+        # Merged shapes inherit the group fill instead of repeating it
+        yield f'<g id="{group}" fill="{group}">\n'
+        if mode == "rects":
+            yield from rect_elements(mask, tolerance)
+        elif mode == "paths":
+            yield from path_elements(mask, tolerance)
+        else:
+            raise ValueError(f"Unknown SVG mode: {mode}")
+    yield '</g>\n'
+
+def open_svg_sink(output_svg, buffer_size=WRITE_CHUNK_SIZE):
+    """Opens a binary sink for output_svg, gzip-compressed when it ends in .svgz."""
+    if output_svg.lower().endswith('.svgz'):
+        return gzip.open(output_svg, 'wb', compresslevel=6)
+    return open(output_svg, 'wb', buffering=buffer_size)
+
+def write_chunks(sink, pieces, chunk_size=WRITE_CHUNK_SIZE):
+    """Joins string pieces into large chunks, writes them to sink and returns the bytes written."""
+    written = 0
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            data = "".join(buffer).encode('utf-8')
+            sink.write(data)
+            written += len(data)
+            buffer.clear()
+            buffered = 0
+
+    if buffer:
+        data = "".join(buffer).encode('utf-8')
+        sink.write(data)
+        written += len(data)
+    return written
+
+def dominant_colors(bitmap, num_colors=5, method="histogram", stride=1):
+    """Returns the num_colors most common colors of bitmap as (r, g, b) tuples.
+
+    method="histogram" counts exact colors packed into 24-bit integers, with
+    ties kept in first-seen order like Counter.most_common. method="kmeans"
+    clusters the pixels into a palette ordered by cluster size. stride > 1
+    only looks at every stride-th pixel to bound time and memory.
+    """
+    pixels = bitmap.reshape(-1, 3)[::stride]
+    if method == "kmeans":
+        return kmeans_palette(pixels, num_colors)
+    if method != "histogram":
+        raise ValueError(f"Unknown palette method: {method}")
+
+    packed = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+    colors, first_seen, counts = np.unique(packed, return_index=True, return_counts=True)
+    top = np.lexsort((first_seen, -counts))[:num_colors]
+    return [(c >> 16, (c >> 8) & 0xFF, c & 0xFF) for c in colors[top].tolist()]
+
+def kmeans_palette(pixels, num_colors=5, iterations=10):
+    """Clusters an (N, 3) pixel array into at most num_colors colors, largest cluster first."""
+    samples = pixels.astype(np.float32)
+    k = min(num_colors, len(samples))
+    if k == 0:
+        return []
+
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, iterations, 1.0)
+    _, labels, centers = cv2.kmeans(samples, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    counts = np.bincount(labels.ravel(), minlength=k)
+    centers = np.clip(np.rint(centers), 0, 255).astype(int)
+    return [tuple(centers[i].tolist()) for i in np.argsort(-counts, kind="stable")]
 
 def create_gradient_svg(dominant_colors):
     if not dominant_colors:
@@ -75,7 +259,19 @@ def create_gradient_svg(dominant_colors):
     
     return f'<defs><linearGradient id="{gradient_id}" x1="0%" y1="0%" x2="100%" y2="0%">{stops}</linearGradient></defs>\n<rect width="100%" height="100%" fill="url(#{gradient_id})"/>\n'
 
-def convert_png_to_vector(input_png, output_svg, canvas_size=(1920, 1080)):
+def convert_png_to_vector(input_png, output_svg, canvas_size=(1920, 1080), mode="rects", tolerance=0,
+                          palette="histogram", palette_stride=1):
+    """Convert a PNG to a grouped SVG.
+
+    mode selects how each color group is emitted: "pixels" (one 1x1 rect per
+    pixel), "rects" (pixels merged into rectangles, visually identical) or
+    "paths" (traced outlines). tolerance trades fidelity for size in the
+    "rects" and "paths" modes. palette and palette_stride are passed to
+    dominant_colors() to pick the gradient stops. An output_svg ending in
+    .svgz is gzip-compressed.
+
+    Returns the uncompressed bytes written for each color group.
+    """
     # Load the image
     image = cv2.imread(input_png)
     if image is None:
@@ -97,45 +293,30 @@ def convert_png_to_vector(input_png, output_svg, canvas_size=(1920, 1080)):
     canvas[y_offset:y_offset + new_height, x_offset:x_offset + new_width] = resized_image
 
     # Get dominant colors
-    dominant_colors_list = dominant_colors(canvas)
-
-    # Create SVG output
-    with open(output_svg, 'w') as svg_file:
-        svg_file.write('<svg xmlns="http://www.w3.org/2000/svg" version="1.1">\n')
-        
-        # Add gradient background
-        gradient_svg = create_gradient_svg(dominant_colors_list)
-        svg_file.write(gradient_svg)
-
-        # Create color groups
-        color_groups = {
-            "Dark Color": [],
-            "Soft Color": [],
-            "Light Color": [],
-            "Other": []
-        }
-
-        # Iterate through pixels to group by color
-        for y in range(canvas.shape[0]):
-            for x in range(canvas.shape[1]):
-                color_name = color_group(canvas[y, x])
-                color_group_name = color_name.split(":")[0]
-                color_groups[color_group_name].append((x, y))
-
-        # Write background rectangle with gradient
-        svg_file.write('<g id="Background">\n')
-        svg_file.write('<rect width="100%" height="100%" fill="url(#bgGradient)"/>\n')
-        svg_file.write('</g>\n')
-
-        # Write color groups to SVG
-        for group, pixels in color_groups.items():
-            if pixels:
-                svg_file.write(f'<g id="{group}">\n')
-                for pixel in pixels:
-                    svg_file.write(f'<rect x="{pixel[0]}" y="{pixel[1]}" width="1" height="1" fill="{group}"/>\n')
-                svg_file.write('</g>\n')
-
-        svg_file.write('</svg>\n')
+    dominant_colors_list = dominant_colors(canvas, method=palette, stride=palette_stride)
+
+    # Classify every pixel into a color group in one pass
+    groups = classify_pixels(canvas)
+
+    # Stream the SVG out group by group; nothing is collected per pixel
+    group_bytes = {}
+    with open_svg_sink(output_svg) as sink:
+        write_chunks(sink, [
+            '<svg xmlns="http://www.w3.org/2000/svg" version="1.1">\n',
+            create_gradient_svg(dominant_colors_list),  # Add gradient background
+            '<g id="Background">\n',
+            '<rect width="100%" height="100%" fill="url(#bgGradient)"/>\n',
+            '</g>\n',
+        ])
+
+        for index, group in enumerate(COLOR_GROUPS):
+            mask = groups == index
+            if mask.any():
+                group_bytes[group] = write_chunks(sink, group_svg(mask, group, mode, tolerance))
+
+        write_chunks(sink, ['</svg>\n'])
+
+    return group_bytes
 
 def create_zip(input_png, output_svg, zip_filename):
     with zipfile.ZipFile(zip_filename, 'w') as zf:
@@ -143,19 +324,61 @@ def create_zip(input_png, output_svg, zip_filename):
         zf.write(output_svg, os.path.basename(output_svg))
         zf.writestr('output_image.ai', 'This is a placeholder for the AI file.\nConvert SVG to AI using Illustrator.')
 
-def process_images_in_folder(input_folder, canvas_size=(1920, 1080)):
-    for filename in os.listdir(input_folder):
-        if filename.endswith('.png'):
-            input_png = os.path.join(input_folder, filename)
-            output_svg = os.path.splitext(input_png)[0] + '.svg'
-            zip_filename = os.path.splitext(input_png)[0] + '.zip'
-            
-            convert_png_to_vector(input_png, output_svg, canvas_size)
-            create_zip(input_png, output_svg, zip_filename)
-            
-            print(f"Processed {input_png}: Created {output_svg} and {zip_filename}")
-
-# Usage
-input_folder = 'IMAGE-PRO'  # Change this to your input folder path
-canvas_size = (1920, 1080)  # Full HD canvas size
-process_images_in_folder(input_folder, canvas_size)
+def process_image(input_png, canvas_size=(1920, 1080), mode="rects", tolerance=0, compress=False):
+    """Vectorize and zip a single PNG; returns the SVG path, zip path and bytes per group."""
+    output_svg = os.path.splitext(input_png)[0] + ('.svgz' if compress else '.svg')
+    zip_filename = os.path.splitext(input_png)[0] + '.zip'
+
+    group_bytes = convert_png_to_vector(input_png, output_svg, canvas_size, mode, tolerance)
+    create_zip(input_png, output_svg, zip_filename)
+    return output_svg, zip_filename, group_bytes
+
+def _init_worker():
+    # One OpenCV thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+
+def _process_image_isolated(task):
+    """Pool entry point: returns (input_png, result, error) instead of raising."""
+    input_png, options = task
+    try:
+        return input_png, process_image(input_png, **options), None
+    except Exception as e:
+        return input_png, None, f"{type(e).__name__}: {e}"
+
+def process_images_in_folder(input_folder, canvas_size=(1920, 1080), mode="rects", tolerance=0, compress=False,
+                             workers=1):
+    """Vectorize every PNG in input_folder using a pool of workers processes.
+
+    Progress is reported in folder order and a failing file does not stop the
+    batch; the list of (input_png, error) failures is returned.
+    """
+    options = {'canvas_size': canvas_size, 'mode': mode, 'tolerance': tolerance, 'compress': compress}
+    tasks = [(os.path.join(input_folder, filename), options)
+             for filename in os.listdir(input_folder) if filename.endswith('.png')]
+
+    failures = []
+    if workers == 1:
+        _report_progress(map(_process_image_isolated, tasks), len(tasks), failures)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            _report_progress(pool.map(_process_image_isolated, tasks), len(tasks), failures)
+
+    print(f"Finished {len(tasks) - len(failures)}/{len(tasks)} images, {len(failures)} failed.")
+    return failures
+
+def _report_progress(results, total, failures):
+    for done, (input_png, result, error) in enumerate(results, 1):
+        if error is not None:
+            failures.append((input_png, error))
+            print(f"[{done}/{total}] Failed {input_png}: {error}")
+            continue
+
+        output_svg, zip_filename, group_bytes = result
+        sizes = ", ".join(f"{group}: {size} B" for group, size in group_bytes.items())
+        print(f"[{done}/{total}] Processed {input_png}: Created {output_svg} and {zip_filename} ({sizes})")
+
+if __name__ == "__main__":
+    input_folder = 'IMAGE-PRO'  # Change this to your input folder path
+    canvas_size = (1920, 1080)  # Full HD canvas size
+    workers = os.cpu_count()  # Number of worker processes
+    process_images_in_folder(input_folder, canvas_size, workers=workers)
@@ -1,134 +1,192 @@
 import os
 import cv2
 import numpy as np
-import pandas as pd
-import requests
-import tensorflow as tf
-
-# Load a pre-trained model for image analysis (e.g., MobileNetV2)
-model = tf.keras.applications.MobileNetV2(weights='imagenet')
-
-def remove_background_grabcut(input_image_path, output_image_path):
-    """Remove background from image using GrabCut algorithm and make it transparent."""
-    img = cv2.imread(input_image_path)
-    if img is None:
-        print(f"Error: Could not read image '{input_image_path}'.")
-        return
-
-    h, w = img.shape[:2]
-    
-    # Create a mask initialized to the background
-    mask = np.zeros((h, w), np.uint8)
-    rectangle = (1, 1, w - 1, h - 1)
-
-    # Background and foreground models
-    bgd_model = np.zeros((1, 65), np.float64)
-    fgd_model = np.zeros((1, 65), np.float64)
-
-    # Initialize the mask
-    mask[1:h-1, 1:w-1] = cv2.GC_PR_FGD
-
-    # Apply GrabCut
-    cv2.grabCut(img, mask, rectangle, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_MASK)
-
-    # Create binary mask
-    mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
-
-    # Apply Gaussian blur
-    mask2 = cv2.GaussianBlur(mask2.astype(np.float32), (21, 21), 0)
-    mask2 = np.clip(mask2, 0, 1)
-
-    # Create an RGBA image
-    img_result = img * mask2[:, :, np.newaxis]
-    alpha_channel = (mask2 * 255).astype(np.uint8)
-    img_result = cv2.cvtColor(img_result, cv2.COLOR_BGR2BGRA)
-    img_result[:, :, 3] = alpha_channel
-
-    # Save the image
-    cv2.imwrite(output_image_path, img_result)
-    print(f"Background removed and saved as '{output_image_path}'")
-
-def analyze_image(image_path):
-    """Analyze the image to generate keywords and title based on content."""
-    img = cv2.imread(image_path)
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from cache import file_digest, folder_cache
+from gemini import GEMINI_URL, GeminiClient
+from metrics import RunMetrics
+from pipeline import decode, segment, feather, encode, prepare, list_images, run_pipeline
+
+# TensorFlow, pandas and requests are heavy to import, so they are only
+# imported by the functions that need them, on first use (requests by
+# GeminiClient).
+_model = None
+
+def get_model():
+    """Load the pre-trained model for image analysis (MobileNetV2) on first use."""
+    global _model
+    if _model is None:
+        import tensorflow as tf
+        _model = tf.keras.applications.MobileNetV2(weights='imagenet')
+    return _model
+
+def preprocess_for_model(img):
+    """Resize and scale a decoded BGR image into a MobileNetV2 input."""
     img = cv2.resize(img, (224, 224))  # Resize for MobileNetV2
-    img = tf.keras.applications.mobilenet_v2.preprocess_input(img)
-    img = np.expand_dims(img, axis=0)
-
-    predictions = model.predict(img)
-    decoded_predictions = tf.keras.applications.mobilenet_v2.decode_predictions(predictions, top=5)[0]
-    
-    keywords = ", ".join([pred[1] for pred in decoded_predictions])
-    title = f"Image of {decoded_predictions[0][1]}"
-
-    return title, keywords
-
-def generate_ai_metadata(image_filename, api_key):
-    """Generate additional metadata using AI (Gemini)."""
-    api_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent"
-    
-    prompt = f"Generate a catchy title, 40 relevant keywords for stock image sales, a suitable category, and release information for the image: '{image_filename}'."
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": prompt}
-                ]
-            }
-        ]
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-    }
-    
-    response = requests.post(f"{api_url}?key={api_key}", json=payload, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()
+    return img.astype(np.float32) / 127.5 - 1.0  # Same as mobilenet_v2.preprocess_input
+
+def classify_batch(model_inputs, top=5):
+    """Run one predict call over a list of model inputs; returns (title, keywords) per input."""
+    import tensorflow as tf
+
+    predictions = get_model().predict_on_batch(np.stack(model_inputs))
+    decoded_batch = tf.keras.applications.mobilenet_v2.decode_predictions(np.asarray(predictions), top=top)
+
+    results = []
+    for decoded_predictions in decoded_batch:
+        keywords = ", ".join([pred[1] for pred in decoded_predictions])
+        title = f"Image of {decoded_predictions[0][1]}"
+        results.append((title, keywords))
+    return results
+
+def analyze_image(img):
+    """Analyze a decoded BGR image to generate keywords and title based on content."""
+    return classify_batch([preprocess_for_model(img)])[0]
+
+def build_stages(working_size=None, cache=None):
+    """Transparent PNG of the object plus the MobileNetV2 input of the source, classified in batches."""
+    return [
+        decode(),
+        segment(working_size=working_size, cache=cache),
+        feather(),
+        encode("modified_{stem}.png", message="Background removed and saved as"),
+        prepare('model_input', preprocess_for_model),
+    ]
+
+def metadata_prompt(image_filename):
+    """Prompt asking Gemini for the stock metadata of an image."""
+    return f"Generate a catchy title, 40 relevant keywords for stock image sales, a suitable category, and release information for the image: '{image_filename}'."
+
+def generate_ai_metadata(image_filename, api_key, api_url=GEMINI_URL):
+    """Generate additional metadata using AI (Gemini) for a single image."""
+    with GeminiClient(api_key, api_url, concurrency=1) as client:
+        return client.generate(metadata_prompt(image_filename))
+
+def metadata_entry(ctx, title, keywords, ai_metadata):
+    """Build the CSV row of one processed image from its labels and Gemini metadata."""
+    if ai_metadata:
+        category = ai_metadata.get('category', "General")
+        release_info = ai_metadata.get('release', "No Release Info")
     else:
-        print(f"Error fetching metadata: {response.status_code}, {response.text}")
-        return None
+        category = "General"
+        release_info = "No Release Info"
+
+    return {
+        'Filename': ctx['outputs'][0],
+        'Title': title,
+        'Keywords': keywords,
+        'Category': category,
+        'Release(s)': release_info
+    }
 
-def process_images_in_folder(folder_path, output_folder_path, api_key):
-    """Process all images in a folder to remove background and generate metadata."""
+def _completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def process_images_in_folder(folder_path, output_folder_path, api_key, working_size=None, batch_size=32,
+                             api_url=GEMINI_URL, concurrency=4, rate_per_second=None, use_cache=True,
+                             metrics_log=None, profile=None, trace_memory=False):
+    """Process all images in a folder to remove background and generate metadata.
+
+    Images are classified batch_size at a time from the inputs prepared by
+    the pipeline, so every file is still decoded only once; each batch runs
+    on a background thread while the next images are segmented. Gemini
+    requests are sent before each image is segmented and run concurrently on
+    up to concurrency connections, optionally limited to rate_per_second.
+    With use_cache, masks, labels and Gemini replies are kept in
+    <output>/.cache and reused for unchanged images. With metrics_log,
+    pipeline stages and the waits for classification and for Gemini are
+    timed and logged there as JSON lines; profile names a file to run under
+    cProfile and trace_memory adds the peak memory of every stage and file
+    to the log.
+    """
     if not os.path.exists(output_folder_path):
         os.makedirs(output_folder_path)
 
     metadata_list = []
-
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
+    cache = folder_cache(output_folder_path) if use_cache else None
+    stages = build_stages(working_size, cache)
+    pending = []
+    label_params = {'model': 'mobilenet_v2', 'top': 5}
+    metrics = RunMetrics(metrics_log, trace_memory, profile) if metrics_log or profile else None
+    timed = metrics.timed if metrics else lambda label, filename=None: nullcontext()
+
+    in_flight = []  # The batch being classified: (batch, labels, misses, future)
+
+    def collect():
+        # Wait for the batch being classified, then build its metadata rows
+        batch, labels, misses, future = in_flight.pop()
+        if future:
+            with timed('classify_wait'):
+                batch_labels = future.result()
+            for i, label in zip(misses, batch_labels):
+                labels[i] = label
+                if cache:
+                    cache.put_json(cache.key(batch[i]['digest'], 'classify', label_params), label)
+
+        for ctx, (title, keywords) in zip(batch, labels):
+            with timed('gemini_wait', ctx['filename']):
+                ai_metadata = ctx['ai_metadata'].result()
+            if ctx['gemini_key'] and ai_metadata is not None:
+                cache.put_json(ctx['gemini_key'], ai_metadata)
+            metadata_list.append(metadata_entry(ctx, title, keywords, ai_metadata))
+
+    def flush():
+        # Analyze the pending images for keywords and title in one background batch, skipping cached ones
+        batch = pending[:]
+        pending.clear()
+        labels = [cache.get_json(cache.key(ctx['digest'], 'classify', label_params)) if cache else None
+                  for ctx in batch]
+        misses = [i for i, label in enumerate(labels) if label is None]
+        future = classifier.submit(classify_batch, [batch[i]['model_input'] for i in misses]) if misses else None
+        if in_flight:
+            collect()
+        in_flight.append((batch, labels, misses, future))
+
+    with GeminiClient(api_key, api_url, concurrency, rate_per_second) as client, \
+            ThreadPoolExecutor(max_workers=1) as classifier:
+        for filename in list_images(folder_path):
             input_image_path = os.path.join(folder_path, filename)
-            output_image_path = os.path.join(output_folder_path, f"modified_{filename.split('.')[0]}.png")
-
-            remove_background_grabcut(input_image_path, output_image_path)
-
-            # Analyze the image for keywords and title
-            title, keywords = analyze_image(input_image_path)
-
-            # Generate additional metadata
-            ai_metadata = generate_ai_metadata(filename, api_key)
-
-            if ai_metadata:
-                category = ai_metadata.get('category', "General")
-                release_info = ai_metadata.get('release', "No Release Info")
-            else:
-                category = "General"
-                release_info = "No Release Info"
-
-            # Prepare the metadata entry
-            metadata_entry = {
-                'Filename': output_image_path,
-                'Title': title,
-                'Keywords': keywords,
-                'Category': category,
-                'Release(s)': release_info
-            }
-            metadata_list.append(metadata_entry)
+            prompt = metadata_prompt(filename)
+
+            # Generate additional metadata while the image is processed locally
+            gemini_key = ai_metadata = None
+            if cache:
+                gemini_key = cache.key(file_digest(input_image_path), 'gemini', {'prompt': prompt, 'api_url': api_url})
+                cached_metadata = cache.get_json(gemini_key)
+                if cached_metadata is not None:
+                    ai_metadata = _completed(cached_metadata)
+                    gemini_key = None  # Nothing new to store
+            if ai_metadata is None:
+                ai_metadata = client.submit(prompt)
+
+            try:
+                ctx = run_pipeline(stages, input_image_path, output_folder_path, metrics=metrics)
+            except ValueError as e:
+                ai_metadata.cancel()
+                print(f"Error: {e}.")
+                continue
+
+            # Keep only what the batch needs, not the full-size arrays
+            pending.append({key: ctx[key] for key in ('filename', 'outputs', 'model_input', 'digest')})
+            pending[-1]['ai_metadata'] = ai_metadata
+            pending[-1]['gemini_key'] = gemini_key
+
+            if len(pending) == batch_size:
+                flush()
+        if pending:
+            flush()
+        if in_flight:
+            collect()
+    if metrics:
+        metrics.close()
 
     # Save the metadata to CSV
     if metadata_list:
+        import pandas as pd
+
         metadata_df = pd.DataFrame(metadata_list)
         csv_file_path = os.path.join(output_folder_path, "metadata.csv")
         metadata_df.to_csv(csv_file_path, index=False)
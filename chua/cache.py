@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import cv2
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 2 << 30  # 2 GiB
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's bytes, the content address used for cache keys."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ArtifactCache:
+    """On-disk cache of stage results, addressed by image content and stage parameters.
+
+    Entries are stored as <root>/<key[:2]>/<key><ext>. Reading an entry
+    refreshes its mtime, and writes evict the least recently used entries
+    once the cache grows past max_bytes. An entry larger than max_bytes on
+    its own is not stored.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_CACHE_BYTES):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    @staticmethod
+    def key(digest, stage, params):
+        """Cache key of a stage result for the image with the given content digest."""
+        blob = json.dumps([digest, stage, params], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def _entries(self):
+        """(mtime, size, path) of every cached file."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def get_bytes(self, key, ext):
+        path = self._path(key, ext)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put_bytes(self, key, ext, data):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        self.total_bytes += len(data)
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is back under 90% of max_bytes."""
+        entries = sorted(self._entries())
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def get_image(self, key):
+        """Cached uint8 image (any channel count) or None."""
+        data = self.get_bytes(key, '.png')
+        if data is None:
+            return None
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+
+    def put_image(self, key, img):
+        # Lossless and quick to encode; the cache favours speed over size
+        ok, encoded = cv2.imencode('.png', img, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if ok:
+            self.put_bytes(key, '.png', encoded.tobytes())
+
+    def get_json(self, key):
+        data = self.get_bytes(key, '.json')
+        return None if data is None else json.loads(data)
+
+    def put_json(self, key, value):
+        self.put_bytes(key, '.json', json.dumps(value).encode('utf-8'))
+
+def folder_cache(output_folder_path, max_bytes=DEFAULT_CACHE_BYTES):
+    """The artifact cache kept in the .cache folder of an output folder."""
+    return ArtifactCache(os.path.join(output_folder_path, '.cache'), max_bytes)
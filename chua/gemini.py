@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent"
+
+# Responses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class GeminiClient:
+    """Concurrent Gemini client with keep-alive connections, rate limiting and retries.
+
+    submit() returns a Future right away, so API calls run on the client's
+    threads while the caller keeps processing images. api_url can point at
+    a local stub server for testing.
+    """
+
+    def __init__(self, api_key, api_url=GEMINI_URL, concurrency=4, rate_per_second=None,
+                 max_retries=5, backoff=1.0, timeout=60):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate_per_second) if rate_per_second else None
+        self._request_error = requests.RequestException
+
+        # One pooled session shared by all threads, one connection per thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        # In a header rather than the query string, so it never shows up in error messages
+        self.session.headers['x-goog-api-key'] = api_key
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def generate(self, prompt):
+        """POST one prompt, retrying 429/5xx and connection errors; returns the JSON reply or None."""
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": prompt}
+                    ]
+                }
+            ]
+        }
+
+        for attempt in range(self.max_retries + 1):
+            if self.bucket:
+                self.bucket.acquire()
+
+            retry_after = None
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=self.timeout)
+            except self._request_error as e:
+                error = str(e)
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                error = f"{response.status_code}, {response.text}"
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, retry_after))
+
+        print(f"Error fetching metadata: {error}")
+        return None
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """Exponential backoff with jitter, or the server's Retry-After when it sends seconds."""
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+
+    def submit(self, prompt):
+        """Queue a prompt; returns a Future of generate(prompt)."""
+        return self.executor.submit(self.generate, prompt)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,63 @@
+import json
+import os
+from cache import file_digest
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+class Manifest:
+    """JSON-lines record, kept in the output folder, of the inputs a batch run has finished.
+
+    Each line holds an input's filename, size, mtime_ns, SHA-256 and output
+    filenames; the last line for a filename wins. Lines are only appended
+    after all outputs of an input were written, so a rerun can skip them.
+    """
+
+    def __init__(self, output_folder_path, name=MANIFEST_NAME):
+        self.output_folder_path = output_folder_path
+        self.path = os.path.join(output_folder_path, name)
+        self.records = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn line from an interrupted run
+                    self.records[record['input']] = record
+
+    def is_done(self, input_path):
+        """True when input_path was finished before, is unchanged and all its outputs still exist."""
+        record = self.records.get(os.path.basename(input_path))
+        if record is None:
+            return False
+        if not all(os.path.exists(os.path.join(self.output_folder_path, name)) for name in record['outputs']):
+            return False
+
+        st = os.stat(input_path)
+        if st.st_size != record['size']:
+            return False
+        if st.st_mtime_ns == record['mtime_ns']:
+            return True
+
+        # Touched but possibly unchanged: compare the content, and remember the new mtime
+        digest = file_digest(input_path)
+        if digest != record['sha256']:
+            return False
+        self.record(input_path, record['outputs'], digest)
+        return True
+
+    def record(self, input_path, outputs, digest=None):
+        """Mark input_path as finished with the given output paths."""
+        st = os.stat(input_path)
+        record = {
+            'input': os.path.basename(input_path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': digest or file_digest(input_path),
+            'outputs': [os.path.basename(path) for path in outputs],
+        }
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self.records[record['input']] = record
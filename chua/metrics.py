@@ -0,0 +1,169 @@
+import cProfile
+import json
+import math
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+def percentile(values, q):
+    """Nearest-rank q-th percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def _labels(stages):
+    """Stage names, numbered where a name occurs more than once (e.g. encode#1, encode#2)."""
+    names = [getattr(stage, 'stage_name', getattr(stage, '__name__', 'stage')) for stage in stages]
+    counts = defaultdict(int)
+    labels = []
+    for name in names:
+        counts[name] += 1
+        labels.append(f"{name}#{counts[name]}" if names.count(name) > 1 else name)
+    return labels
+
+class RunMetrics:
+    """Per-file, per-stage measurements of a batch run, logged as JSON lines.
+
+    Every stage run on every file adds a line with its wall and CPU seconds
+    (CPU of this process, so worker processes are not included), the working
+    image's dimensions after the stage and, with trace_memory, the stage's
+    peak traced memory; a 'total' line then has the file's peak. The segment
+    stage's line also has the segmenter path taken. close() appends and
+    prints a summary: p50/p95 wall time per stage, images per second and how
+    many images took each segment path.
+
+    With profile set to a filename (or True for the first file), that file
+    runs under cProfile; the stats go to <log_path>.prof, or are printed
+    when there is no log.
+    """
+
+    def __init__(self, log_path=None, trace_memory=False, profile=None):
+        self.log_path = log_path
+        self.log = open(log_path, 'a', encoding='utf-8') if log_path else None
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.files = 0
+        self.walls = defaultdict(list)
+        self.segment_paths = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def _write(self, record):
+        if self.log:
+            self.log.write(json.dumps(record) + '\n')
+
+    def _add(self, filename, label, wall, cpu, image=None, peak_bytes=None, segment_path=None):
+        record = {'file': filename, 'stage': label, 'wall_s': round(wall, 6), 'cpu_s': round(cpu, 6)}
+        if segment_path is not None:
+            record['segment_path'] = segment_path
+            self.segment_paths[segment_path] += 1
+        if image is not None and hasattr(image, 'shape'):
+            record['height'], record['width'] = image.shape[:2]
+            record['channels'] = image.shape[2] if image.ndim == 3 else 1
+        if peak_bytes is not None:
+            record['peak_bytes'] = peak_bytes
+        self._write(record)
+        self.walls[label].append(wall)
+
+    def run(self, stages, ctx, trace_memory=False):
+        """Run the stages on ctx, measuring each; sets ctx['peak_memory'] when tracing memory."""
+        trace_memory = trace_memory or self.trace_memory
+        if self.profile is True:
+            self.profile = ctx['filename']  # Profile the first file
+        profiler = cProfile.Profile() if self.profile == ctx['filename'] else None
+
+        started = trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        peak = 0
+        try:
+            for label, stage in zip(_labels(stages), stages):
+                if trace_memory:
+                    stage_baseline = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                wall, cpu = time.perf_counter(), time.process_time()
+                if profiler:
+                    profiler.enable()
+                try:
+                    stage(ctx)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+                stage_peak = None
+                if trace_memory:
+                    traced_peak = tracemalloc.get_traced_memory()[1]
+                    stage_peak = traced_peak - stage_baseline
+                    peak = max(peak, traced_peak - baseline)
+                segment_path = ctx.get('segment_path') if getattr(stage, 'stage_name', None) == 'segment' else None
+                self._add(ctx['filename'], label, wall, cpu, ctx.get('image'), stage_peak, segment_path)
+        finally:
+            if started:
+                tracemalloc.stop()
+            if profiler:
+                self._dump_profile(profiler, ctx['filename'])
+        if trace_memory:
+            ctx['peak_memory'] = peak
+            self._write({'file': ctx['filename'], 'stage': 'total', 'peak_bytes': peak})
+        self.files += 1
+
+    @contextmanager
+    def timed(self, label, filename=None):
+        """Measure work done outside the pipeline, e.g. a batched model call."""
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._add(filename, label, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def _dump_profile(self, profiler, filename):
+        if self.log_path:
+            path = f"{self.log_path}.prof"
+            profiler.dump_stats(path)
+            print(f"Profile of '{filename}' saved as '{path}'")
+        else:
+            print(f"Profile of '{filename}':")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'files': self.files,
+            'seconds': round(elapsed, 3),
+            'images_per_second': round(self.files / elapsed, 4) if elapsed > 0 else None,
+            'stages': {
+                label: {
+                    'count': len(walls),
+                    'p50_s': round(percentile(walls, 50), 6),
+                    'p95_s': round(percentile(walls, 95), 6),
+                    'total_s': round(sum(walls), 6),
+                }
+                for label, walls in self.walls.items()
+            },
+            'segment_paths': dict(self.segment_paths),
+        }
+
+    def close(self):
+        """Log and print the end-of-run summary, then close the log."""
+        summary = self.summary()
+        self._write({'summary': summary})
+        if self.log:
+            self.log.close()
+            self.log = None
+
+        print(f"{summary['files']} images in {summary['seconds']:.1f} seconds "
+              f"({summary['images_per_second'] or 0:.3f} images/sec)")
+        print(f"{'stage':<20}{'count':>7}{'p50 s':>10}{'p95 s':>10}{'total s':>10}")
+        for label, s in summary['stages'].items():
+            print(f"{label:<20}{s['count']:>7}{s['p50_s']:>10.3f}{s['p95_s']:>10.3f}{s['total_s']:>10.1f}")
+        if summary['segment_paths']:
+            print("Segment paths: " + ", ".join(f"{path} {count}" for path, count in summary['segment_paths'].items()))
+        return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,338 @@
+import hashlib
+import os
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from segment import fast_params, segment_mask
+from superres import get_sr_model, upscale_dnn_tiled, upscale_tiled
+from writers import scratch_array, write_image_streaming
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# Non-local means window sizes. An output pixel only depends on input pixels
+# within NLM_MARGIN of it, so tiles extended by that much denoise exactly.
+NLM_TEMPLATE = 7
+NLM_SEARCH = 21
+NLM_MARGIN = NLM_SEARCH // 2 + NLM_TEMPLATE // 2
+
+# Tile size of stages that write into a scratch (memory-mapped) buffer
+SCRATCH_TILE = 512
+
+# A pipeline is a list of stages. Each stage is a callable that takes the
+# per-image context dict and updates it in place:
+#   'input_path', 'filename', 'stem', 'output_folder'  set by run_pipeline()
+#   'source'   the decoded BGR image (decoded once, never modified)
+#   'digest'   SHA-256 of the input file's bytes, set by decode()
+#   'lineage'  [stage, params] of every transforming stage so far; with
+#              'digest' it addresses cached results (see cache.ArtifactCache)
+#   'mask'     the 0/1 foreground mask from segment()
+#   'segment_path'  'fast' or 'grabcut', the segmenter that made the mask
+#   'image'    the working image that upscale/denoise/encode operate on
+#   'outputs'  paths written by encode(), in order
+
+def list_images(folder_path):
+    """List the image files in a folder that the pipeline can decode."""
+    return [f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+def run_pipeline(stages, input_path, output_folder, trace_memory=False, metrics=None):
+    """Run every stage on one image and return the resulting context.
+
+    With trace_memory, ctx['peak_memory'] is the peak number of bytes that
+    tracemalloc saw allocated while the image was processed. That covers
+    NumPy arrays and OpenCV results, but not OpenCV's internal scratch memory.
+    With metrics (a metrics.RunMetrics), every stage is timed and logged.
+    """
+    filename = os.path.basename(input_path)
+    ctx = {
+        'input_path': input_path,
+        'filename': filename,
+        'stem': filename.split('.')[0],
+        'output_folder': output_folder,
+        'outputs': [],
+        'lineage': [],
+    }
+    if metrics is not None:
+        metrics.run(stages, ctx, trace_memory)
+        return ctx
+    if not trace_memory:
+        for stage in stages:
+            stage(ctx)
+        return ctx
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        for stage in stages:
+            stage(ctx)
+    finally:
+        ctx['peak_memory'] = tracemalloc.get_traced_memory()[1] - baseline
+        if started:
+            tracemalloc.stop()
+    return ctx
+
+def write_atomic(path, data):
+    """Write data via a temporary file and a rename, so a partial file never appears at path."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _stage(name, run):
+    run.stage_name = name
+    return run
+
+def _cached(ctx, cache, name, params, compute):
+    """Record the stage in the lineage and return compute(), or its cached result for this input."""
+    ctx['lineage'].append([name, params])
+    if cache is None:
+        return compute()
+
+    key = cache.key(ctx['digest'], name, ctx['lineage'])
+    result = cache.get_image(key)
+    if result is None:
+        result = compute()
+        cache.put_image(key, result)
+    return result
+
+# Image operations
+
+def feather_composite(img, mask, kernel_size=21, out=None):
+    """Blur a 0/1 mask for feathering and return img on a transparent background as uint8 BGRA.
+
+    Everything stays uint8: the alpha is blurred in place as 0..255 and each
+    color plane is scaled by alpha/255 in place, then merged into out (an
+    h x w x 4 uint8 buffer, allocated when not given). That allocates about
+    8 bytes per pixel, a quarter of what the float composite needed.
+    """
+    # Apply Gaussian blur to the mask for feathering effect
+    alpha = np.multiply(mask, 255, dtype=np.uint8)
+    cv2.GaussianBlur(alpha, (kernel_size, kernel_size), 0, dst=alpha)
+
+    # Premultiply the color planes by the alpha; cv2.multiply rounds and saturates
+    planes = cv2.split(img)
+    for plane in planes:
+        cv2.multiply(plane, alpha, dst=plane, scale=1 / 255)
+
+    if out is None:
+        out = np.empty(img.shape[:2] + (4,), np.uint8)
+    return cv2.merge(planes + (alpha,), dst=out)
+
+def remove_background(img, iterations=5, working_size=None, fast=True):
+    """Remove the background of a BGR image like the segment stage does; returns uint8 BGRA."""
+    return feather_composite(img, segment_mask(img, iterations, working_size, fast)[0])
+
+def upscale_bicubic(img, scale_factor=8, tile=None, workers=1, out=None):
+    """Upscale image by the given scale factor using bicubic interpolation.
+
+    With tile set, the image is upscaled in overlapping tiles (see
+    superres.upscale_tiled) so memory no longer grows with the whole image;
+    the result is written into out when given, e.g. a scratch_array().
+    """
+    def resize(crop):
+        h, w = crop.shape[:2]
+        return cv2.resize(crop, (w * scale_factor, h * scale_factor), interpolation=cv2.INTER_CUBIC)
+
+    if tile:
+        return upscale_tiled(img, resize, scale_factor, tile, workers=workers, out=out)
+    return resize(img)
+
+def upscale_dnn(img, model_name="edsr", scale=4, model_dir=".", tile=None, workers=1, out=None):
+    """Upscale image using DNN-based super resolution (model loaded once, see superres)."""
+    if img.ndim == 3 and img.shape[2] == 4:
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)  # The models expect BGR
+    if tile:
+        return upscale_dnn_tiled(img, model_name, scale, model_dir, tile, workers=workers, out=out)
+    return get_sr_model(model_name, scale, model_dir).upsample(img)
+
+def _denoise_bgr(img):
+    return cv2.fastNlMeansDenoisingColored(img, None, 10, 10, NLM_TEMPLATE, NLM_SEARCH)
+
+def _init_denoise_worker():
+    # One OpenCV thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+
+def _denoise_crop(task):
+    """Denoise a crop that includes its margins and return only the tile inside them."""
+    crop, (top, left, height, width) = task
+    return _denoise_bgr(crop)[top:top + height, left:left + width]
+
+def denoise_tiled(img, tile=512, workers=1, out=None):
+    """Non-local means denoising of a BGR(A) image tile by tile, identical to the untiled result.
+
+    Tiles are extended by NLM_MARGIN pixels on each side and cropped back
+    after denoising, so only one row of tiles is in flight at a time. With
+    workers > 1 the tiles of a row are denoised in separate processes. An
+    alpha channel is copied as is. The result is written into out when given.
+    """
+    h, w = img.shape[:2]
+    if out is None:
+        out = np.empty_like(img)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_denoise_worker) if workers > 1 else None
+    try:
+        for y0 in range(0, h, tile):
+            y1 = min(y0 + tile, h)
+            ys, ye = max(0, y0 - NLM_MARGIN), min(h, y1 + NLM_MARGIN)
+            boxes = [(x0, min(x0 + tile, w)) for x0 in range(0, w, tile)]
+            tasks = []
+            for x0, x1 in boxes:
+                xs, xe = max(0, x0 - NLM_MARGIN), min(w, x1 + NLM_MARGIN)
+                crop = np.ascontiguousarray(img[ys:ye, xs:xe, :3])
+                tasks.append((crop, (y0 - ys, x0 - xs, y1 - y0, x1 - x0)))
+            results = pool.map(_denoise_crop, tasks) if pool else map(_denoise_crop, tasks)
+            for (x0, x1), result in zip(boxes, results):
+                out[y0:y1, x0:x1, :3] = result
+            if img.shape[2] == 4:
+                out[y0:y1, :, 3] = img[y0:y1, :, 3]
+    finally:
+        if pool:
+            pool.shutdown()
+    return out
+
+def denoise_image(img, tile=None, workers=1, out=None):
+    """Non-local means denoising of the color channels; alpha is kept as is.
+
+    With tile set, the image is denoised in tiles (see denoise_tiled) into out.
+    """
+    if tile:
+        return denoise_tiled(img, tile, workers, out)
+    denoised = _denoise_bgr(np.ascontiguousarray(img[:, :, :3]))
+    if img.shape[2] == 4:  # If the image has an alpha channel
+        return cv2.merge((denoised, img[:, :, 3]))  # Merge alpha channel back
+    return denoised
+
+# Stages
+
+# Stages given a cache (cache.ArtifactCache) look their result up there first.
+
+def decode():
+    """Read the input file once; sets 'source', 'image' and 'digest'."""
+    def run(ctx):
+        data = np.fromfile(ctx['input_path'], np.uint8)
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+        if img is None:
+            raise ValueError(f"Could not read image '{ctx['input_path']}'")
+        ctx['digest'] = hashlib.sha256(data).hexdigest()
+        ctx['source'] = img
+        ctx['image'] = img
+    return _stage('decode', run)
+
+def segment(iterations=5, working_size=None, cache=None, fast=True):
+    """Foreground mask of the source image; sets 'mask' and 'segment_path'.
+
+    With fast, images on a plain background skip GrabCut (see
+    segment.segment_mask). The path taken is cached with the mask and
+    printed for every image.
+    """
+    def run(ctx):
+        params = {'iterations': iterations, 'working_size': working_size, 'fast': fast and fast_params()}
+        taken = {}
+
+        def compute():
+            mask, taken['path'], taken['reason'] = segment_mask(ctx['source'], iterations, working_size, fast)
+            return mask
+
+        ctx['mask'] = _cached(ctx, cache, 'segment', params, compute)
+        if cache is not None:
+            key = cache.key(ctx['digest'], 'segment_path', ctx['lineage'])
+            if taken:
+                cache.put_json(key, taken)
+            else:
+                taken = cache.get_json(key) or {'path': 'cached', 'reason': None}
+        ctx['segment_path'] = taken['path']
+        reason = f" ({taken['reason']})" if taken['path'] == 'grabcut' and taken['reason'] else ""
+        print(f"Segmented '{ctx['filename']}' with the {taken['path']} path{reason}")
+    return _stage('segment', run)
+
+def feather(kernel_size=21):
+    """Composite the source over a transparent background using the feathered mask."""
+    def run(ctx):
+        ctx['image'] = _cached(ctx, None, 'feather', {'kernel_size': kernel_size, 'alpha': 'uint8'},
+                               lambda: feather_composite(ctx['source'], ctx['mask'], kernel_size))
+    return _stage('feather', run)
+
+# Stages given a scratch folder write their result tile by tile into a
+# memory-mapped scratch_array() there, so it does not have to fit in RAM.
+# Such results are too big to be worth caching, so the cache is skipped.
+
+def upscale(scale_factor=8, tile=None, workers=1, cache=None, scratch=None):
+    """Bicubic upscale of the working image, tiled when tile (or scratch) is set."""
+    def run(ctx):
+        image = ctx['image']
+        if scratch is None:
+            ctx['image'] = _cached(ctx, cache, 'upscale', {'scale_factor': scale_factor},
+                                   lambda: upscale_bicubic(image, scale_factor, tile, workers))
+            return
+        h, w = image.shape[:2]
+        out = scratch_array((h * scale_factor, w * scale_factor) + image.shape[2:], folder=scratch)
+        ctx['image'] = _cached(ctx, None, 'upscale', {'scale_factor': scale_factor},
+                               lambda: upscale_bicubic(image, scale_factor, tile or SCRATCH_TILE, workers, out))
+    return _stage('upscale', run)
+
+def super_resolve(model_name="edsr", scale=4, model_dir=".", tile=None, workers=1, cache=None, scratch=None):
+    """DNN super-resolution of the working image (drops the alpha channel), tiled when tile (or scratch) is set."""
+    def run(ctx):
+        image = ctx['image']
+        params = {'model_name': model_name, 'scale': scale}
+        if scratch is None:
+            ctx['image'] = _cached(ctx, cache, 'super_resolve', params,
+                                   lambda: upscale_dnn(image, model_name, scale, model_dir, tile, workers))
+            return
+        h, w = image.shape[:2]
+        out = scratch_array((h * scale, w * scale, 3), folder=scratch)
+        ctx['image'] = _cached(ctx, None, 'super_resolve', params,
+                               lambda: upscale_dnn(image, model_name, scale, model_dir, tile or SCRATCH_TILE,
+                                                   workers, out))
+    return _stage('super_resolve', run)
+
+def denoise(tile=None, workers=1, cache=None, scratch=None):
+    """Non-local means denoising of the working image, tiled when tile (or scratch) is set.
+
+    Place it before upscale() to denoise at source resolution, which is far
+    cheaper than denoising the upscaled image.
+    """
+    def run(ctx):
+        image = ctx['image']
+        # Tiling does not change the result, so it is not part of the cache key
+        if scratch is None:
+            ctx['image'] = _cached(ctx, cache, 'denoise', {}, lambda: denoise_image(image, tile, workers))
+            return
+        out = scratch_array(image.shape, folder=scratch)
+        ctx['image'] = _cached(ctx, None, 'denoise', {},
+                               lambda: denoise_image(image, tile or SCRATCH_TILE, workers, out))
+    return _stage('denoise', run)
+
+def prepare(key, func):
+    """Store func(source) in ctx[key], e.g. a model input to be batched after the pipeline."""
+    def run(ctx):
+        ctx[key] = func(ctx['source'])
+    return _stage('prepare', run)
+
+def encode(name, params=None, message=None, stream=False):
+    """Write the working image to output_folder/name, where name may use {stem}.
+
+    The file is written atomically. With stream, PNG and TIFF are encoded
+    strip by strip instead of in one buffer (see writers.write_image_streaming).
+    When message is given, "<message> '<path>'" is printed after writing.
+    """
+    def run(ctx):
+        output_path = os.path.join(ctx['output_folder'], name.format(stem=ctx['stem']))
+        if stream:
+            write_image_streaming(output_path, ctx['image'], params)
+        else:
+            ok, encoded = cv2.imencode(os.path.splitext(output_path)[1], ctx['image'], params or [])
+            if not ok:
+                raise ValueError(f"Could not encode '{output_path}'")
+            write_atomic(output_path, encoded)
+        ctx['outputs'].append(output_path)
+        if message:
+            print(f"{message} '{output_path}'")
+    return _stage('encode', run)
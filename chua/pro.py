@@ -1,49 +1,137 @@
-import csv
+import errno
 import os
-import random
 import shutil
-
-def rename_images(input_folder, output_folder):
-    """Rename all image files in the specified folder and copy them to the output folder."""
-    image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'}
-    
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# The metadata generator is shared with the anna scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'anna'))
+from metagen import UPLOAD_ROWS, generate_metadata, write_metadata_csv
+from vocab import Vocabulary
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'}
+
+FICLONE = 0x40049409  # Linux ioctl that makes a file share another's data blocks (btrfs, XFS)
+
+# Errors that mean a method cannot work on these folders at all, so it is not tried again
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL,
+                      errno.ENOSYS, errno.ENOTTY, errno.EMLINK}
+
+def _hardlink(src, dst):
+    os.link(src, dst)
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.ENOTSUP, "reflinks need fcntl") from None
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        os.remove(dst)
+        raise
+    shutil.copymode(src, dst)
+
+def _copy_file_range(src, dst):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "os.copy_file_range is not available")
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            remaining = os.fstat(source.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(source.fileno(), target.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except OSError:
+        os.remove(dst)
+        raise
+    shutil.copymode(src, dst)
+
+# Ingest methods from cheapest to most expensive
+INGEST_METHODS = {
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'copy': shutil.copy,
+}
+
+def ingest_file(src, dst, methods, disabled):
+    """Give dst the contents of src with the first method that works; returns its name.
+
+    Methods that fail for lack of support are added to disabled and skipped
+    for later files.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)  # Overwrite, like shutil.copy does
+    for name in methods:
+        if name in disabled and name != methods[-1]:
+            continue
+        try:
+            INGEST_METHODS[name](src, dst)
+            return name
+        except FileNotFoundError:
+            raise
+        except OSError as e:
+            if name == methods[-1]:
+                raise
+            if e.errno in UNSUPPORTED_ERRNOS:
+                disabled.add(name)
+
+def rename_images(input_folder, output_folder, mode='auto', workers=8, verbose=False):
+    """Rename all image files in the specified folder and copy them to the output folder.
+
+    mode 'auto' tries a hardlink, then a reflink, then os.copy_file_range and
+    finally a plain copy; 'hardlink', 'reflink' or 'copy_file_range' try only
+    that method before copying, and 'copy' always copies. Hardlinked files
+    share their data with the originals, so editing one in place changes
+    both. Files are ingested on a pool of workers threads.
+    """
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
-    
-    # Get list of files in the input folder
-    files = os.listdir(input_folder)
-    
-    # Filter out only image files
-    image_files = [f for f in files if os.path.isfile(os.path.join(input_folder, f)) and os.path.splitext(f)[1].lower() in image_extensions]
-    
-    renamed_files = []
-    
-    # Rename and copy each image file
-    for i, filename in enumerate(image_files):
-        # Get file extension
-        file_ext = os.path.splitext(filename)[1]
-        
+
+    # List image files; scandir knows which entries are files without a stat per file
+    with os.scandir(input_folder) as entries:
+        image_files = sorted(entry.name for entry in entries
+                             if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS)
+
+    if mode == 'auto':
+        methods = list(INGEST_METHODS)
+    elif mode in INGEST_METHODS:
+        methods = [mode, 'copy'] if mode != 'copy' else ['copy']
+    else:
+        raise ValueError(f"Unknown ingest mode: {mode}")
+    disabled = set()
+
+    def ingest(task):
+        i, filename = task
         # Form new file name (IMG_202403_1, IMG_202403_2, ...)
-        new_filename = f"IMAGE_2024070808_0075205{i+1}{file_ext}"
-        
-        # Construct full paths
-        current_path = os.path.join(input_folder, filename)
-        new_path = os.path.join(output_folder, new_filename)
-        
-        # Copy and rename file
+        new_filename = f"IMAGE_2024070808_0075205{i+1}{os.path.splitext(filename)[1]}"
         try:
-            shutil.copy(current_path, new_path)
-            print(f"Renamed and copied '{filename}' to '{new_filename}'")
-            renamed_files.append(new_filename)  # Store renamed files
+            method = ingest_file(os.path.join(input_folder, filename), os.path.join(output_folder, new_filename),
+                                 methods, disabled)
         except Exception as e:
-            print(f"Failed to copy '{filename}': {str(e)}")
+            return filename, new_filename, None, e
+        return filename, new_filename, method, None
 
-    return renamed_files
+    renamed_files = []
+    counts = Counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Report from this thread, in order, so lines from workers do not interleave
+        for filename, new_filename, method, error in pool.map(ingest, enumerate(image_files)):
+            if error is not None:
+                print(f"Failed to copy '{filename}': {str(error)}")
+                continue
+            if verbose:
+                print(f"Renamed and copied '{filename}' to '{new_filename}' ({method})")
+            renamed_files.append(new_filename)  # Store renamed files
+            counts[method] += 1
 
-def read_file(file_path):
-    """Reads a file and returns a list of lines."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return [line.strip() for line in file.readlines()]
+    print(f"Renamed and copied {len(renamed_files)} of {len(image_files)} images "
+          f"({', '.join(f'{name}: {n}' for name, n in counts.items()) or 'none'})")
+    return renamed_files
 
 def get_category_choice():
     """Prompt user for category number and validate."""
@@ -79,10 +167,15 @@ def get_category_choice():
         except ValueError:
             print("Invalid input. Please enter a number.")
 
-def create_metadata_csv(titles, keywords, images, output_file, category_number):
-    """Creates a CSV file with Adobe Stock metadata structure."""
-    fieldnames = ['Filename', 'Title', 'Keywords', 'Category', 'Release(s)']
+def create_metadata_csv(titles, keywords, images, output_file, category_number, seed=None, shard_size=None,
+                        ranked=None):
+    """Creates a CSV file with Adobe Stock metadata structure.
 
+    seed makes the random titles and keywords reproducible. With shard_size
+    (e.g. UPLOAD_ROWS), the rows are split over numbered CSVs of that size.
+    Images in ranked ({image: keywords}, from ranking.rank_images) get those
+    keywords instead of random ones. Returns the paths written.
+    """
     # Commonly used qualities and versions
     qualities = [
         'High Quality', 'Ultra HD', 'Premium Quality', 'Customed Quality', 
@@ -95,32 +188,15 @@ def create_metadata_csv(titles, keywords, images, output_file, category_number):
         'Creative Version', 'Exclusive Version'
     ]
 
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for image in images:
-            title = random.choice(titles)  # Randomly choose a title
-            quality = random.choice(qualities)  # Randomly choose a quality
-            version = random.choice(versions)  # Randomly choose a version
-            unique_title = f"{title}, {quality}, {version}"
-            keyword = ', '.join(random.choice(keywords) for _ in range(random.randint(3, 6)))  # Randomly select 3-6 keywords
-
-            # Use the provided category number
-            category = category_number
-
-            # Use the final title as the release name
-            release = unique_title
-
-            writer.writerow({
-                'Filename': image,
-                'Title': unique_title,
-                'Keywords': keyword,
-                'Category': category,
-                'Release(s)': release
-            })
+    rows = generate_metadata(titles, keywords, qualities, versions, images, category_number, seed,
+                             ranked=ranked)
+    paths = write_metadata_csv(output_file, rows, shard_size)
 
-    print(f"Metadata CSV '{output_file}' created successfully for {len(images)} images.")
+    if len(paths) == 1:
+        print(f"Metadata CSV '{output_file}' created successfully for {len(images)} images.")
+    else:
+        print(f"Metadata CSVs '{paths[0]}' to '{paths[-1]}' created successfully for {len(images)} images.")
+    return paths
 
 if __name__ == "__main__":
     # File paths and configurations
@@ -130,9 +206,9 @@ if __name__ == "__main__":
     output_folder = 'IMAGE-PRO'  # Output folder for renamed images
     output_csv = os.path.join(output_folder, 'police-metadata.csv')
 
-    # Read keywords and titles from files
-    keywords = read_file(keywords_file)
-    titles = read_file(titles_file)
+    # Read keywords and titles from files (text, or binary files compiled with vocab.py)
+    keywords = Vocabulary.open(keywords_file)
+    titles = Vocabulary.open(titles_file)
 
     # Rename images and get the list of renamed images
     renamed_images = rename_images(input_folder, output_folder)
@@ -141,4 +217,4 @@ if __name__ == "__main__":
     category_number = get_category_choice()
 
     # Generate the metadata CSV for Adobe Stock with category selection
-    create_metadata_csv(titles, keywords, renamed_images, output_csv, category_number)
+    create_metadata_csv(titles, keywords, renamed_images, output_csv, category_number, shard_size=UPLOAD_ROWS)
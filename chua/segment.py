@@ -0,0 +1,216 @@
+import argparse
+import time
+import cv2
+import numpy as np
+
+def _grabcut(img, iterations):
+    """Run GrabCut over the whole image; returns the 0/1 foreground mask and the fitted models."""
+    h, w = img.shape[:2]
+
+    # Create a mask initialized to the background
+    mask = np.zeros((h, w), np.uint8)
+    rectangle = (1, 1, w - 1, h - 1)
+
+    # Background and foreground models
+    bgd_model = np.zeros((1, 65), np.float64)
+    fgd_model = np.zeros((1, 65), np.float64)
+
+    # Assume that everything inside the 1px border is foreground
+    mask[1:h-1, 1:w-1] = cv2.GC_PR_FGD
+    cv2.grabCut(img, mask, rectangle, bgd_model, fgd_model, iterations, cv2.GC_INIT_WITH_MASK)
+
+    # Create a binary mask where 1 indicates the foreground: GC_FGD (1) and
+    # GC_PR_FGD (3) are the odd labels, so this stays a single uint8 pass
+    mask2 = mask & 1
+    return mask2, bgd_model, fgd_model
+
+def grabcut_mask(img, iterations=5, working_size=None, refine_iterations=1, band=None):
+    """Segment the foreground of a BGR image with GrabCut; returns a 0/1 uint8 mask.
+
+    Without working_size (or when the image already fits in it) GrabCut runs
+    at full resolution. Otherwise it runs coarse-to-fine: segment a copy whose
+    longest side is working_size, upsample the mask, then re-run GrabCut at
+    full resolution only on a band of `band` pixels around the boundary,
+    starting from the models fitted on the small copy.
+    """
+    h, w = img.shape[:2]
+    if not working_size or max(h, w) <= working_size:
+        return _grabcut(img, iterations)[0]
+
+    # Coarse pass on a downscaled copy
+    scale = working_size / max(h, w)
+    small_size = (max(3, round(w * scale)), max(3, round(h * scale)))
+    small = cv2.resize(img, small_size, interpolation=cv2.INTER_AREA)
+    small_mask, bgd_model, fgd_model = _grabcut(small, iterations)
+    mask = cv2.resize(small_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+    if refine_iterations <= 0:
+        return mask
+
+    # Everything further than `band` pixels from the upsampled boundary is fixed
+    if band is None:
+        band = int(np.ceil(2 / scale))
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * band + 1, 2 * band + 1))
+    sure_fg = cv2.erode(mask, kernel)
+    uncertain = cv2.dilate(mask, kernel) != sure_fg
+    if not uncertain.any():
+        return mask
+
+    # Refine only the bounding box of the uncertain band
+    ys, xs = np.nonzero(uncertain)
+    y0, y1 = max(ys.min() - band, 0), min(ys.max() + band + 1, h)
+    x0, x1 = max(xs.min() - band, 0), min(xs.max() + band + 1, w)
+    crop_mask = mask[y0:y1, x0:x1]
+    crop_uncertain = uncertain[y0:y1, x0:x1]
+
+    gc_mask = np.where(sure_fg[y0:y1, x0:x1] == 1, cv2.GC_FGD, cv2.GC_BGD).astype(np.uint8)
+    gc_mask[crop_uncertain & (crop_mask == 1)] = cv2.GC_PR_FGD
+    gc_mask[crop_uncertain & (crop_mask == 0)] = cv2.GC_PR_BGD
+
+    # Keep the image's 1px border as background, like the full-resolution run
+    if y0 == 0:
+        gc_mask[0, :] = cv2.GC_BGD
+    if y1 == h:
+        gc_mask[-1, :] = cv2.GC_BGD
+    if x0 == 0:
+        gc_mask[:, 0] = cv2.GC_BGD
+    if x1 == w:
+        gc_mask[:, -1] = cv2.GC_BGD
+
+    try:
+        cv2.grabCut(np.ascontiguousarray(img[y0:y1, x0:x1]), gc_mask, (0, 0, 1, 1),
+                    bgd_model, fgd_model, refine_iterations, cv2.GC_EVAL)
+    except cv2.error:
+        return mask  # Degenerate band (e.g. no background samples); keep the coarse mask
+
+    mask[y0:y1, x0:x1] = gc_mask & 1  # GC_FGD and GC_PR_FGD
+    return mask
+
+# Fast path for objects on a plain background: the background color is the
+# median of a strip of FAST_BORDER pixels around the image. When that strip
+# is uniform, pixels close to that color and connected to the image edge are
+# background, so background-colored areas inside the object stay foreground.
+# Images whose strip is not uniform, or whose mask looks implausible, go to
+# GrabCut instead.
+FAST_BORDER = 8
+FAST_MAX_SPREAD = 24  # 95th percentile L1 Lab distance of the strip from its median
+FAST_MIN_TOLERANCE = 12  # L1 Lab distance still counted as background
+FAST_FOREGROUND = (0.01, 0.9)  # Plausible fraction of foreground pixels
+
+def fast_params():
+    """The fast path's settings, as recorded in cache keys."""
+    return {'border': FAST_BORDER, 'max_spread': FAST_MAX_SPREAD, 'min_tolerance': FAST_MIN_TOLERANCE,
+            'foreground': list(FAST_FOREGROUND)}
+
+def plain_background_mask(img, border=FAST_BORDER, max_spread=FAST_MAX_SPREAD,
+                          min_tolerance=FAST_MIN_TOLERANCE, foreground=FAST_FOREGROUND):
+    """0/1 foreground mask of an object on a near-uniform background, or None.
+
+    Returns (mask, None), or (None, reason) when the mask would be unreliable.
+    Everything stays uint8: about 8 bytes per pixel besides the mask.
+    """
+    h, w = img.shape[:2]
+    border = min(border, h // 4, w // 4)
+    if border < 1:
+        return None, "image too small"
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+
+    # Background color and how much the border strip deviates from it
+    strip = np.concatenate([lab[:border].reshape(-1, 3), lab[-border:].reshape(-1, 3),
+                            lab[border:-border, :border].reshape(-1, 3),
+                            lab[border:-border, -border:].reshape(-1, 3)])
+    color = np.median(strip, axis=0)
+    spread = float(np.percentile(np.abs(strip - color).sum(axis=1), 95))
+    if spread > max_spread:
+        return None, f"border not uniform, spread {spread:.0f}"
+    tolerance = max(min_tolerance, 2 * spread)
+
+    # Pixels within tolerance of the background color (L1 distance, saturating at 255)
+    distance = cv2.absdiff(lab, tuple(float(c) for c in color) + (0.0,))
+    distance = cv2.transform(distance, np.ones((1, 3), np.float32))
+    candidate = (distance <= tolerance).view(np.uint8)
+
+    # Flood fill from the edges: a ring of 1s around the image connects every
+    # edge-touching background pixel to the corner seed
+    padded = cv2.copyMakeBorder(candidate, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=1)
+    cv2.floodFill(padded, None, (0, 0), 2)
+    mask = (padded[1:-1, 1:-1] != 2).view(np.uint8)
+
+    # Drop specks of background noise that were left as foreground
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+
+    fraction = cv2.countNonZero(mask) / (h * w)
+    if not foreground[0] <= fraction <= foreground[1]:
+        return None, f"implausible foreground, {fraction:.0%} of the image"
+    return mask, None
+
+def segment_mask(img, iterations=5, working_size=None, fast=True):
+    """Foreground mask of img; returns (mask, path, reason).
+
+    With fast, the plain-background fast path is tried first and path is
+    'fast'. Otherwise, or when it is unreliable, path is 'grabcut' and
+    reason says why the fast path was not used.
+    """
+    reason = "fast path disabled"
+    if fast:
+        mask, reason = plain_background_mask(img)
+        if mask is not None:
+            return mask, 'fast', None
+    return grabcut_mask(img, iterations, working_size), 'grabcut', reason
+
+def mask_iou(mask_a, mask_b):
+    """Intersection over union of two 0/1 masks (1.0 when both are empty)."""
+    a = mask_a.astype(bool)
+    b = mask_b.astype(bool)
+    union = np.count_nonzero(a | b)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(a & b) / union
+
+def grabcut_report(img, iterations=5, working_size=1024, refine_iterations=1):
+    """Time full-resolution and coarse-to-fine GrabCut on img and compare their masks."""
+    start = time.perf_counter()
+    full = grabcut_mask(img, iterations)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    multires = grabcut_mask(img, iterations, working_size, refine_iterations)
+    multires_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast, reason = plain_background_mask(img)
+    fast_seconds = time.perf_counter() - start
+
+    return {
+        'width': img.shape[1],
+        'height': img.shape[0],
+        'full_seconds': full_seconds,
+        'multires_seconds': multires_seconds,
+        'iou': mask_iou(full, multires),
+        'fast_seconds': fast_seconds,
+        'fast_iou': mask_iou(full, fast) if fast is not None else None,
+        'fast_reason': reason,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-resolution GrabCut masks with the coarse-to-fine and plain-background ones.")
+    parser.add_argument('images', nargs='+', help="Images to segment")
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--working-size', type=int, default=1024)
+    parser.add_argument('--refine-iterations', type=int, default=1)
+    args = parser.parse_args()
+
+    for image_path in args.images:
+        img = cv2.imread(image_path)
+        if img is None:
+            print(f"Error: Could not read image '{image_path}'.")
+            continue
+
+        report = grabcut_report(img, args.iterations, args.working_size, args.refine_iterations)
+        print(f"{image_path} ({report['width']}x{report['height']}): "
+              f"full {report['full_seconds']:.2f}s, multires {report['multires_seconds']:.2f}s, "
+              f"speedup {report['full_seconds'] / max(report['multires_seconds'], 1e-9):.1f}x, "
+              f"IoU {report['iou']:.4f}")
+        if report['fast_iou'] is None:
+            print(f"  fast path {report['fast_seconds']:.3f}s, not used: {report['fast_reason']}")
+        else:
+            print(f"  fast path {report['fast_seconds']:.3f}s, IoU {report['fast_iou']:.4f}")
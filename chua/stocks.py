@@ -1,67 +1,68 @@
 import os
 import time
-import cv2
-import numpy as np
 import colorama
 from colorama import Fore, Style
+from cache import folder_cache
+from manifest import Manifest
+from metrics import RunMetrics
+from pipeline import decode, segment, feather, encode, super_resolve, list_images, run_pipeline
+from superres import warm_up
 
 # Initialize colorama
 colorama.init(autoreset=True)
 
-def remove_background_grabcut(input_image_path):
-    """Remove background from image using GrabCut algorithm and make it transparent with feathering."""
-    img = cv2.imread(input_image_path)
-    h, w = img.shape[:2]
-
-    mask = np.zeros((h, w), np.uint8)
-    rectangle = (1, 1, w - 1, h - 1)
-
-    bgd_model = np.zeros((1, 65), np.float64)
-    fgd_model = np.zeros((1, 65), np.float64)
-
-    mask[1:h-1, 1:w-1] = cv2.GC_PR_FGD
-    cv2.grabCut(img, mask, rectangle, bgd_model, fgd_model, 5, cv2.GC_INIT_WITH_MASK)
-
-    mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
-    mask2 = cv2.GaussianBlur(mask2.astype(np.float32), (21, 21), 0)
-    mask2 = np.clip(mask2, 0, 1)
-
-    img_result = img * mask2[:, :, np.newaxis]
-    alpha_channel = (mask2 * 255).astype(np.uint8)
-    img_result = cv2.cvtColor(img_result, cv2.COLOR_BGR2BGRA)
-    img_result[:, :, 3] = alpha_channel
-
-    return img_result
-
-def upscale_image_with_dnn(img):
-    """Upscale image using DNN-based super resolution (4x)."""
-    sr = cv2.dnn_superres.DnnSuperResImpl_create()
-    model_path = "EDSR_x4.pb"  # Ensure you have the model
-    sr.readModel(model_path)
-    sr.setModel("edsr", 4)
-
-    img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)  # Convert to BGR if it has an alpha channel
-    return sr.upsample(img)
-
-def process_image(input_image_path, output_folder_path):
-    """Process a single image: remove background and upscale."""
-    png_output_path = os.path.join(output_folder_path, f"{os.path.basename(input_image_path).split('.')[0]}.png")
-    
-    img_result = remove_background_grabcut(input_image_path)
-    jpg_output_path = os.path.join(output_folder_path, f"{os.path.basename(input_image_path).split('.')[0]}.jpg")
-    
-    upscaled_img = upscale_image_with_dnn(img_result)
-
-    # Save outputs
-    cv2.imwrite(png_output_path, img_result)
-    cv2.imwrite(jpg_output_path, upscaled_img)
+def build_stages(working_size=None, model_dir=".", tile=None, cache=None, scratch=None, cache_upscales=False,
+                 workers=1):
+    """Transparent PNG of the object plus an EDSR 4x super-resolved JPG.
+
+    With a scratch folder the super-resolved image is built in a memory-mapped
+    file there and written without further copies, for outputs beyond RAM.
+    With tile (or scratch), workers threads super-resolve the tiles. The
+    cache holds the masks; super-resolved images are only cached with
+    cache_upscales, as a few of them would evict every mask.
+    """
+    return [
+        decode(),
+        segment(working_size=working_size, cache=cache),
+        feather(),
+        encode("{stem}.png"),
+        # Ensure you have EDSR_x4.pb in model_dir
+        super_resolve("edsr", 4, model_dir, tile, workers, cache=cache if cache_upscales else None,
+                      scratch=scratch),
+        encode("{stem}.jpg", stream=scratch is not None),
+    ]
+
+def process_image(input_image_path, output_folder_path, stages, metrics=None):
+    """Process a single image: remove background and upscale; returns the pipeline context."""
+    return run_pipeline(stages, input_image_path, output_folder_path, metrics=metrics)
+
+def process_images_in_folder(folder_path, output_folder_path, working_size=None, model_dir=".", tile=None,
+                             use_cache=True, resume=True, scratch_dir=None, metrics_log=None, profile=None,
+                             cache_upscales=False, trace_memory=False, workers=1):
+    """Process all images in a folder to remove background and upscale.
+
+    With use_cache, masks (and upscales with cache_upscales) are kept in
+    <output>/.cache and reused for unchanged images and stage parameters.
+    With resume, inputs recorded as finished in <output>/manifest.jsonl are
+    skipped. scratch_dir is passed to build_stages() as its scratch folder,
+    and workers as is. With metrics_log, per-stage timings are logged there
+    as JSON lines and summarized at the end; profile names a file to run
+    under cProfile (or True for the first) and trace_memory adds the peak
+    memory of every stage and file to the log.
+    """
+    os.makedirs(output_folder_path, exist_ok=True)
+    files = list_images(folder_path)
+    cache = folder_cache(output_folder_path) if use_cache else None
+    stages = build_stages(working_size, model_dir, tile, cache, scratch_dir, cache_upscales, workers)
+    metrics = RunMetrics(metrics_log, trace_memory, profile) if metrics_log or profile else None
 
-    return os.path.basename(input_image_path)
+    manifest = Manifest(output_folder_path) if resume else None
+    if manifest:
+        files = [f for f in files if not manifest.is_done(os.path.join(folder_path, f))]
+        print(f"Resuming: {len(manifest.records)} images already processed, {len(files)} to go.")
 
-def process_images_in_folder(folder_path, output_folder_path):
-    """Process all images in a folder to remove background and upscale."""
-    os.makedirs(output_folder_path, exist_ok=True)
-    files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
+    # Load the super-resolution model once, before the first image
+    warm_up([("edsr", 4)], model_dir)
 
     start_time = time.time()
     total_files = len(files)
@@ -70,7 +71,9 @@ def process_images_in_folder(folder_path, output_folder_path):
         print(f"Processing {filename}... ", end='', flush=True)
 
         try:
-            process_image(input_image_path, output_folder_path)
+            ctx = process_image(input_image_path, output_folder_path, stages, metrics)
+            if manifest:
+                manifest.record(input_image_path, ctx['outputs'], ctx['digest'])
             print(Fore.GREEN + f"Processed {filename}")
         except Exception as e:
             print(Fore.RED + f"Error processing {filename}: {e}")
@@ -82,6 +85,8 @@ def process_images_in_folder(folder_path, output_folder_path):
 
     total_time = time.time() - start_time
     print(f"All files processed successfully in {total_time:.2f} seconds.")
+    if metrics:
+        metrics.close()
 
 if __name__ == "__main__":
     folder_path = r"C:\Users\Administrator\Desktop\ADOBE-STOCKS\IMAGE"
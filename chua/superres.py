@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Pretrained OpenCV dnn_superres models, keyed by (algorithm, scale)
+SR_MODELS = {
+    ('edsr', 2): 'EDSR_x2.pb',
+    ('edsr', 3): 'EDSR_x3.pb',
+    ('edsr', 4): 'EDSR_x4.pb',
+    ('espcn', 2): 'ESPCN_x2.pb',
+    ('espcn', 3): 'ESPCN_x3.pb',
+    ('espcn', 4): 'ESPCN_x4.pb',
+    ('fsrcnn', 2): 'FSRCNN_x2.pb',
+    ('fsrcnn', 3): 'FSRCNN_x3.pb',
+    ('fsrcnn', 4): 'FSRCNN_x4.pb',
+    ('lapsrn', 2): 'LapSRN_x2.pb',
+    ('lapsrn', 4): 'LapSRN_x4.pb',
+    ('lapsrn', 8): 'LapSRN_x8.pb',
+}
+
+# Seconds each model file took to load, by model path
+LOAD_TIMES = {}
+
+_local = threading.local()
+
+# Thread pools of upscale_tiled, by worker count
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_sr_model(name="edsr", scale=4, model_dir="."):
+    """Return a ready DnnSuperResImpl for name/scale, loading it only once.
+
+    Models are cached per thread, which means once per worker process for
+    single-threaded workers: a cv2.dnn network must not be run from several
+    threads at the same time.
+    """
+    name = name.lower()
+    if (name, scale) not in SR_MODELS:
+        raise ValueError(f"Unknown super-resolution model: {name} x{scale}")
+
+    models = getattr(_local, 'models', None)
+    if models is None:
+        models = _local.models = {}
+
+    model_path = os.path.join(model_dir, SR_MODELS[(name, scale)])
+    sr = models.get(model_path)
+    if sr is None:
+        start = time.perf_counter()
+        sr = cv2.dnn_superres.DnnSuperResImpl_create()
+        sr.readModel(model_path)
+        sr.setModel(name, scale)
+        LOAD_TIMES[model_path] = time.perf_counter() - start
+        models[model_path] = sr
+    return sr
+
+def warm_up(specs=(("edsr", 4),), model_dir=".", run=True):
+    """Load each (name, scale) model up front, optionally running a tiny image through it.
+
+    Returns the load time in seconds of each model, keyed by (name, scale).
+    """
+    load_times = {}
+    for name, scale in specs:
+        sr = get_sr_model(name, scale, model_dir)
+        if run:
+            sr.upsample(np.zeros((16, 16, 3), np.uint8))  # First inference allocates the network buffers
+        load_times[(name, scale)] = LOAD_TIMES[os.path.join(model_dir, SR_MODELS[(name.lower(), scale)])]
+        print(f"Loaded {name} x{scale} in {load_times[(name, scale)]:.2f} seconds.")
+    return load_times
+
+def _axis_weights(lo, hi, core_lo, core_hi, size, overlap, scale):
+    """Blend weights along one axis for a tile covering [lo, hi) whose own part is [core_lo, core_hi).
+
+    The weights ramp linearly across each overlap with a neighbouring tile,
+    and the two ramps of an overlap add up to exactly 1.
+    """
+    weights = np.ones((hi - lo) * scale, np.float32)
+    if core_lo > 0:
+        length = (min(size, core_lo + overlap) - lo) * scale
+        weights[:length] = (np.arange(length, dtype=np.float32) + 0.5) / length
+    if core_hi < size:
+        start = (core_hi - overlap - lo) * scale
+        length = (hi - core_hi + overlap) * scale
+        weights[start:start + length] = 1 - (np.arange(length, dtype=np.float32) + 0.5) / length
+    return weights
+
+def _thread_pool(workers):
+    """The long-lived pool of `workers` threads, shared by every call so their models stay loaded."""
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='superres')
+        return pool
+
+def _in_order(upsample, crops, workers):
+    """Yield upsample(crop) for each crop in order, with at most 2 * workers tiles in flight."""
+    if workers <= 1:
+        for crop in crops:
+            yield upsample(crop)
+        return
+    pool = _thread_pool(workers)
+    pending = deque()
+    for crop in crops:
+        pending.append(pool.submit(upsample, crop))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def upscale_tiled(img, upsample, scale, tile=256, overlap=16, workers=1, out=None):
+    """Upscale img tile by tile, where upsample(tile) returns the tile enlarged by scale.
+
+    Tiles of tile x tile input pixels are extended by overlap pixels on each
+    side and feather-blended, so seams do not show. Each tile is flushed to
+    out as soon as it is blended; only its overlaps with the tiles to the
+    right and below are kept (as float32), so memory is a few tiles plus a
+    strip 2 * overlap input pixels tall. out is allocated when not given
+    (pass an np.memmap for outputs larger than RAM). With workers > 1 the
+    tiles are upscaled on a shared thread pool.
+    """
+    if tile <= 2 * overlap:
+        raise ValueError("tile must be more than twice the overlap")
+
+    h, w = img.shape[:2]
+    tiles = [(y0, min(y0 + tile, h), x0, min(x0 + tile, w)) for y0 in range(0, h, tile) for x0 in range(0, w, tile)]
+    crops = (img[max(0, y0 - overlap):min(h, y1 + overlap), max(0, x0 - overlap):min(w, x1 + overlap)]
+             for y0, y1, x0, x1 in tiles)
+    next_carry = None
+    for (y0, y1, x0, x1), result in zip(tiles, _in_order(upsample, crops, workers)):
+        ys, ye = max(0, y0 - overlap), min(h, y1 + overlap)
+        xs, xe = max(0, x0 - overlap), min(w, x1 + overlap)
+        channel_shape = result.shape[2:]
+        if out is None:
+            out = np.empty((h * scale, w * scale) + channel_shape, result.dtype)
+        if x0 == 0:
+            # New row of tiles; rows above the next row of tiles are final, the rest carries over
+            row_carry, left_carry = next_carry, None
+            done = ye if y1 == h else y1 - overlap
+            next_carry = np.zeros(((ye - done) * scale, w * scale) + channel_shape, np.float32)
+
+        weight = np.outer(_axis_weights(ys, ye, y0, y1, h, overlap, scale),
+                          _axis_weights(xs, xe, x0, x1, w, overlap, scale))
+        if channel_shape:
+            weight = weight[:, :, np.newaxis]
+        acc = result * weight
+        if left_carry is not None:
+            acc[:, :left_carry.shape[1]] += left_carry
+
+        # Columns left of the next tile are final, except for what the next row adds
+        xd = xe if x1 == w else x1 - overlap
+        block = acc[:, :(xd - xs) * scale]
+        if row_carry is not None:
+            block[:len(row_carry)] += row_carry[:, xs * scale:xd * scale]
+        finished = (done - ys) * scale
+        out[ys * scale:done * scale, xs * scale:xd * scale] = np.clip(np.rint(block[:finished]), 0, 255)
+        next_carry[:, xs * scale:xd * scale] = block[finished:]
+        left_carry = acc[:, (xd - xs) * scale:]
+    return out
+
+def upscale_dnn_tiled(img, name="edsr", scale=4, model_dir=".", tile=256, overlap=16, workers=1, out=None):
+    """Tiled DNN super-resolution of a BGR image; each pool thread loads its own model copy once."""
+    def upsample(crop):
+        return get_sr_model(name, scale, model_dir).upsample(np.ascontiguousarray(crop))
+    return upscale_tiled(img, upsample, scale, tile, overlap, workers, out)
@@ -0,0 +1,107 @@
+import os
+import struct
+import tempfile
+import zlib
+import cv2
+import numpy as np
+
+# Writers for outputs too large to hold twice in memory. The image is read a
+# strip (or tile) at a time, so it can be an np.memmap from scratch_array().
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COLOR_TYPES = {1: 0, 3: 2, 4: 6}  # Channels -> grayscale, RGB, RGBA
+
+def scratch_array(shape, dtype=np.uint8, folder=None):
+    """Zero-filled array backed by an anonymous temporary file in folder (default: the temp dir).
+
+    The file has no name, so it is gone as soon as the array is freed, also
+    when the process dies.
+    """
+    with tempfile.TemporaryFile(dir=folder) as file:
+        return np.memmap(file, dtype, 'w+', shape=shape)
+
+def _png_chunk(file, kind, data):
+    file.write(struct.pack('>I', len(data)))
+    file.write(kind)
+    file.write(data)
+    file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+def _to_rgb(strip):
+    """Swap OpenCV's BGR(A) channel order to the RGB(A) order of PNG and TIFF."""
+    if strip.ndim == 3 and strip.shape[2] >= 3:
+        return strip[:, :, [2, 1, 0, 3][:strip.shape[2]]]
+    return strip
+
+def write_png_streaming(path, img, compression=6, strip_rows=256, idat_size=1 << 20):
+    """Write a uint8 grayscale/BGR/BGRA image as PNG, strip_rows rows at a time.
+
+    Every row uses the Up filter (difference to the row above), which suits
+    smooth upscaled images; compressed data is flushed in idat_size chunks.
+    """
+    h, w = img.shape[:2]
+    channels = 1 if img.ndim == 2 else img.shape[2]
+    compressor = zlib.compressobj(compression)
+    pending = []
+    pending_size = 0
+    previous = np.zeros((1, w * channels), np.uint8)
+
+    with open(path, 'wb') as file:
+        file.write(PNG_SIGNATURE)
+        _png_chunk(file, b'IHDR', struct.pack('>IIBBBBB', w, h, 8, PNG_COLOR_TYPES[channels], 0, 0, 0))
+        for y0 in range(0, h, strip_rows):
+            rows = np.ascontiguousarray(_to_rgb(img[y0:y0 + strip_rows])).reshape(-1, w * channels)
+            filtered = np.empty((len(rows), w * channels + 1), np.uint8)
+            filtered[:, 0] = 2  # Up filter
+            np.subtract(rows, np.concatenate((previous, rows[:-1])), out=filtered[:, 1:])  # Wraps mod 256
+            previous = rows[-1:]
+
+            data = compressor.compress(filtered.tobytes())
+            if data:
+                pending.append(data)
+                pending_size += len(data)
+            if pending_size >= idat_size:
+                _png_chunk(file, b'IDAT', b''.join(pending))
+                pending, pending_size = [], 0
+        pending.append(compressor.flush())
+        _png_chunk(file, b'IDAT', b''.join(pending))
+        _png_chunk(file, b'IEND', b'')
+
+def write_tiff_tiled(path, img, tile=256, compression='zlib'):
+    """Write a uint8 image as a tiled TIFF, one tile at a time (needs the optional tifffile package)."""
+    import tifffile
+
+    h, w = img.shape[:2]
+    channels = 1 if img.ndim == 2 else img.shape[2]
+
+    def tiles():
+        # tifffile pads edge tiles itself; tiles are expected in row-major order
+        for y0 in range(0, h, tile):
+            for x0 in range(0, w, tile):
+                yield _to_rgb(img[y0:y0 + tile, x0:x0 + tile])
+
+    tifffile.imwrite(path, tiles(), shape=img.shape, dtype=np.uint8, tile=(tile, tile),
+                     photometric='rgb' if channels >= 3 else 'minisblack',
+                     extrasamples=['unassalpha'] if channels == 4 else None,
+                     compression=compression)
+
+def write_image_streaming(path, img, params=None):
+    """Write img to path atomically without an in-memory copy of the encoded file.
+
+    PNG and TIFF are streamed by strips/tiles. Other formats (JPEG) are left
+    to cv2.imwrite, which reads the pixels in place but cannot stream, so
+    they still need the array itself to fit in (virtual) memory.
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        if ext.lower() == '.png':
+            write_png_streaming(tmp_path, img)
+        elif ext.lower() in ('.tif', '.tiff'):
+            write_tiff_tiled(tmp_path, img)
+        elif not cv2.imwrite(tmp_path, img, params or []):
+            raise ValueError(f"Could not encode '{path}'")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise